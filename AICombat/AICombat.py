@@ -12,10 +12,12 @@ clock, and main game loop.
 """
 
 # Global imports
+import time
 import pygame
 
 # Local imports
 from battle import Battle
+from pacing import Pacer
 
 class Game(object):
 
@@ -34,38 +36,57 @@ class Game(object):
         # Other modes in the future may include menu, settings, splash, etc.
         self.battle = Battle()
         self.game_tick = 20
+        # Keeps the game responsive when updates can't keep up, see pacing.py
+        self.pacer = Pacer(self.game_tick)
 
     """
     Starts the game by entering into the infinite game loop
     """
     def start(self):
 
-        elapsed = 0
+        pacer = self.pacer
+        shown_metrics = None
         while 1:
             # Sleep in such a way that the game does not exceed 60 FPS
             # (This value is completely arbitrary)
-            elapsed += self.clock.tick(60)
+            pacer.start_frame(self.clock.tick(60))
 
-            while elapsed >= self.game_tick:
+            # Run as many ticks as the pacer allows this frame
+            while pacer.should_update():
                 # Event processing
                 events = []
                 for event in pygame.event.get():
                     if event.type == pygame.QUIT:
+                        self.battle.close()
                         return
                     events.append(event)
 
                 # Update battle state
+                start = time.time()
                 self.battle.update(events, self.game_tick)
-                elapsed -= self.game_tick
+                pacer.end_update(time.time() - start)
 
             # Paint stuff (does not actually paint until you call
             # pygame.display.update)
             # The list of rects returned by the draw tells pygame.display
             # which parts to actually draw
-            rects = self.battle.draw(self.screen)
-
-            # Paint the screen
-            pygame.display.update(rects)
+            # The pacer may skip painting while the game catches up
+            if pacer.should_draw():
+                start = time.time()
+                rects = self.battle.draw(self.screen)
+
+                # Paint the screen
+                pygame.display.update(rects)
+                pacer.end_draw(time.time() - start)
+
+            # Show how the game is keeping up in the title bar
+            metrics = pacer.get_metrics()
+            if metrics is not shown_metrics:
+                shown_metrics = metrics
+                pygame.display.set_caption(
+                    "AI Combat - {tps:.0f} TPS, {fps:.0f} FPS, "
+                    "update {update_ms:.1f} ms, draw {draw_ms:.1f} ms, "
+                    "dropped {dropped_ticks} ticks".format(**metrics))
 
 """
 When AICombat.py is run, it will more or less skip everything until it sees the
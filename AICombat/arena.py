@@ -5,42 +5,77 @@ Maintains the list of bots and other objects.
 """
 
 # Global imports
+import gc
 import pygame
 
 # Local imports
+import real.definitions as d
 import utils.geometry as g
+from real.bulletengine import BulletEngine
 from real.realbot import Realbot
+from real.dispatch import Dispatcher
 from real.entity import Entity
+from real.perception import Perception
 from real.wall import Wall
+from utils.spatialhash import SpatialHash
 from virtual import *
 
+"""
+Adds the screen area to repaint for something that was painted at one spot
+and now is at another
+IN:  - list of pygame.Rect to add to
+     - pygame.Rect where it was painted, or None if it wasn't yet
+     - pygame.Rect where it is now
+"""
+def _mark_dirty(rects, old, new):
+    if old is None:
+        rects.append(new)
+    elif old.colliderect(new):
+        rects.append(old.union(new))
+    else:
+        rects.append(old)
+        rects.append(new)
+
 class Arena(Entity):
 
-    def __init__(self):
+    """
+    IN:  - optional list of (left, top, virtualbot class) tuples giving the
+           bots to spawn. Defaults to a hardcoded set of bots for testing
+         - number of threads virtualbots decide on, see Dispatcher
+         - ms of CPU time each decision may take, or None for no limit
+         - what happens to a bot going over budget, one of d.overrun
+    """
+    def __init__(self, bot_info=None, decision_workers=0, decision_budget=None,
+                 overrun=d.overrun.CONTINUE):
 
         # Initialize arena as an entity
         body = pygame.Rect(0, 0, 400, 400)
         Entity.__init__(self, "img/arena.png", body)
 
+        # Background and walls, painted together (see bake_static_layer)
+        self.static_layer = None
+
         # Initialize basic arena traits
         # For now, hardcode some walls for testing
         self.walls = pygame.sprite.LayeredUpdates()
-        self.walls.add(Wall(pygame.Rect(100, 100, 100, 10)))
-        self.walls.add(Wall(pygame.Rect(100, 200, 52, 148)))
-        self.walls.add(Wall(pygame.Rect(0, 30, 100, 10)))
-        self.walls.add(Wall(pygame.Rect(40, 100, 12, 96)))
-        self.walls.add(Wall(pygame.Rect(60, 150, 6, 86)))
-        self.walls.add(Wall(pygame.Rect(200, 0, 20, 96)))
+        self.add_wall(pygame.Rect(100, 100, 100, 10))
+        self.add_wall(pygame.Rect(100, 200, 52, 148))
+        self.add_wall(pygame.Rect(0, 30, 100, 10))
+        self.add_wall(pygame.Rect(40, 100, 12, 96))
+        self.add_wall(pygame.Rect(60, 150, 6, 86))
+        self.add_wall(pygame.Rect(200, 0, 20, 96))
 
         # Initialize real bots
-        # For now, hardcode in bots for testing
+        # Unless told otherwise, hardcode in bots for testing
         self.bots = pygame.sprite.LayeredUpdates()
-        bot_info = [(10, 100, Dumbbot),
-                    (200, 100, Dumbbot),
-                    (250, 100, Navbot),
-                    (350, 250, Stalkerbot),
-                    (0, 0, Stalkerbot),
-                    (200, 350, Playerbot)]
+        self.vbots = {}
+        if bot_info is None:
+            bot_info = [(10, 100, Dumbbot),
+                        (200, 100, Dumbbot),
+                        (250, 100, Navbot),
+                        (350, 250, Stalkerbot),
+                        (0, 0, Stalkerbot),
+                        (200, 350, Playerbot)]
         arena_data = {"walls": [w.body for w in self.walls.sprites()],
                       "arena": self.body,
                       "step": Realbot.STEP}
@@ -50,20 +85,77 @@ class Arena(Entity):
             vbot = info[2](arena_data)
             rbot.attach_vbot(vbot)
             self.bots.add(rbot)
+            self.vbots[rbot.eid] = vbot
 
         # Declare another list that stores non-bots
         self.others = pygame.sprite.LayeredUpdates()
 
+        # Every bullet in flight
+        self.bullets = BulletEngine()
+
+        # Who sees whom, recomputed every tick before bots decide
+        self.perception = Perception()
+
+        # Bots ready for a decision this tick, refilled every tick
+        self.ready = []
+
+        # Garbage collector counts as of the start of the last tick, and the
+        # objects the tick left behind, see get_object_growth()
+        self.gc_count = None
+        self.object_growth = None
+
+        # Asks the virtualbots for their decisions
+        self.dispatcher = Dispatcher(decision_workers, decision_budget,
+                                     overrun)
+
+        # Index of bot bodies, rebuilt every tick, for bullet hit testing
+        self.bot_index = SpatialHash(32)
+
+        # Screen areas that need repainting on the next draw besides the
+        # ones of entities that moved, e.g. where dead entities used to be
+        self.dirty_rects = []
+        self.full_redraw = True
+
+    """
+    Adds a wall to the map
+    IN:  - pygame.Rect representing the wall
+    """
+    def add_wall(self, body):
+        self.walls.add(Wall(body))
+        self.static_layer = None
+
+    """
+    Paints the background and every wall onto one surface. None of it changes
+    until the map does, so a frame only needs to copy from this surface.
+    """
+    def bake_static_layer(self):
+        self.static_layer = self.base_image.copy()
+        offset = (-self.base_rect.left, -self.base_rect.top)
+        for wall in self.walls.sprites():
+            self.static_layer.blit(wall.image, wall.rect.move(offset))
+        self.full_redraw = True
+
     """
     Remove any dead entities from the sprite group.
+    IN:  - sprite group to sweep
+         - list of the group's sprites, as taken earlier in the tick, so
+           that the sweep doesn't need a copy of its own
     """
-    def remove_dead(self, sprite_group):
-        rm_list = []
-        for entity in sprite_group.sprites():
+    def remove_dead(self, sprite_group, entities):
+        for entity in entities:
             if entity.is_dead(self):
-                rm_list.append(entity)
-        for entity in rm_list:
-            sprite_group.remove(entity)
+                sprite_group.remove(entity)
+                if entity.drawn_rect:
+                    self.dirty_rects.append(entity.drawn_rect)
+
+    """
+    Releases resources held by the arena and its virtualbots, such as decision
+    threads and worker processes. Dead bots' virtualbots are closed too.
+    """
+    def close(self):
+        self.dispatcher.close()
+        for vbot in self.vbots.itervalues():
+            vbot.close()
 
     """
     Called once per game tick
@@ -71,31 +163,173 @@ class Arena(Entity):
     """
     def update(self, events, elapsed):
 
-        # Do updates
-        for bot in self.bots.sprites():
-            bot.update(self, elapsed)
-        for entity in self.others.sprites():
+        # Move bots along with whatever they are doing, then let the ready
+        # ones decide. Deciding never moves a bot, so everyone can share one
+        # view of where the bots are this tick
+        self._count_objects()
+        self.bullets.begin_tick()
+        bots = self.bots.sprites()
+        ready = self.ready
+        del ready[:]
+        for bot in bots:
+            if bot.update_state(self, elapsed):
+                ready.append(bot)
+        self.perception.update(bots)
+        self.dispatcher.decide(self, ready, elapsed)
+
+        # Bots are done moving, so index where they are now
+        self.bot_index.clear()
+        for bot in bots:
+            self.bot_index.insert(bot, bot.body)
+
+        self.bullets.update(self, elapsed)
+        others = self.others.sprites()
+        for entity in others:
             entity.update(self, elapsed)
 
         # Remove dead stuff
-        self.remove_dead(self.others)
-        self.remove_dead(self.bots)
+        self.remove_dead(self.others, others)
+        self.remove_dead(self.bots, bots)
+
+    """
+    Reports how many bullet slots were added during the last tick. Bullets
+    live in reused slots (see BulletEngine), so once a match fires at a steady
+    rate this stays at zero.
+    OUT: - int, number of bullet slots added
+    """
+    def get_bullet_slot_growth(self):
+        return self.bullets.slot_growth
 
+    """
+    Reports how many more objects the garbage collector tracked (lists,
+    dicts, tuples, instances, ...) as the last tick started than as the one
+    before it started. Objects created and freed in between cancel out, so
+    this measures what a tick, and whatever was drawn after it, left behind
+    rather than how much they allocated: once a match has settled it is zero
+    most ticks. Numbers, strings and Rects aren't tracked, so they aren't
+    counted.
+    OUT: - int, net number of objects added, or None if the garbage collector
+           ran in between, which resets its counts
+    """
+    def get_object_growth(self):
+        return self.object_growth
+
+    """
+    Samples the garbage collector's counts at the start of a tick, see
+    get_object_growth()
+    """
+    def _count_objects(self):
+        count = gc.get_count()
+        last = self.gc_count
+        # A collection resets the count of the youngest generation and bumps
+        # the next one's
+        if last is not None and count[1:] == last[1:]:
+            self.object_growth = count[0] - last[0]
+        else:
+            self.object_growth = None
+        self.gc_count = count
+
+    """
+    Finds out how many upcoming ticks can be jumped over because nothing
+    would happen in them. Each entity reports when it next needs waking up:
+    bots in the middle of a turn or a recoil when their cooldown runs out,
+    bullets when they run out of range or reach a bot. The earliest wake-up
+    bounds the jump. A bot that moves or decides wakes up every tick, and
+    bullets rely on bots standing still, so bots are asked first.
+    IN:  - length of a game tick in ms
+    OUT: - int, number of ticks that can be skipped
+    """
+    def get_idle_ticks(self, elapsed):
+        wakers = self.bots.sprites()
+        if self.bullets:
+            wakers.append(self.bullets)
+        wakers.extend(self.others.sprites())
+        idle = None
+        for entity in wakers:
+            wake = entity.get_idle_ticks(self, elapsed)
+            if wake <= 0:
+                return 0
+            if idle is None or wake < idle:
+                idle = wake
+        return idle or 0
+
+    """
+    Jumps over ticks promised idle by get_idle_ticks(). The arena ends up
+    exactly as if update() had been called that many times.
+    IN:  - length of a game tick in ms
+         - number of ticks to skip
+    """
+    def skip_ticks(self, elapsed, ticks):
+        for entity in self.bots.sprites() + self.others.sprites():
+            entity.skip_ticks(self, elapsed, ticks)
+        self.bullets.skip_ticks(self, elapsed, ticks)
 
     """
     Called once per game frame
-    Clears the arena and redraws the entities in updated positions
+    Repaints only the parts of the arena that changed since the last frame:
+    wherever an entity moved from or to, and wherever one disappeared
     Output: A list of rects that need to be redrawn
     """
     def draw(self, screen):
-        screen.blit(self.base_image, self.base_rect)
-        self.walls.draw(screen)
-        self.bots.draw(screen)
-        self.others.draw(screen)
+        sprites = self.bots.sprites() + self.others.sprites()
+        bullets = self.bullets
+        bullet_rects = bullets.get_rects()
+
+        # Re-bake the background and walls if the map changed
+        if self.static_layer is None:
+            self.bake_static_layer()
+
+        # The first frame paints everything
+        if self.full_redraw:
+            self.full_redraw = False
+            self.dirty_rects = []
+            screen.blit(self.static_layer, self.base_rect)
+            self.bots.draw(screen)
+            self.others.draw(screen)
+            for rect in bullet_rects:
+                screen.blit(bullets.image, rect)
+            for sprite in sprites:
+                sprite.dirty = False
+                sprite.drawn_rect = sprite.rect.copy()
+            bullets.drawn[:len(bullet_rects)] = bullet_rects
+            del bullets.vacated[:]
+            return [self.base_rect]
+
+        # Find where things changed. An entity that moved only a little
+        # gets one rect covering both its old and new spots
+        rects = self.dirty_rects + bullets.vacated
+        self.dirty_rects = []
+        del bullets.vacated[:]
+        for sprite in sprites:
+            if not sprite.dirty:
+                continue
+            new = sprite.rect.copy()
+            _mark_dirty(rects, sprite.drawn_rect, new)
+            sprite.dirty = False
+            sprite.drawn_rect = new
+        for old, new in zip(bullets.drawn, bullet_rects):
+            if old != new:
+                _mark_dirty(rects, old, new)
+        bullets.drawn[:len(bullet_rects)] = bullet_rects
+        rects = [r.clip(self.base_rect) for r in rects]
+        rects = [r for r in rects if r.width and r.height]
+        if not rects:
+            return []
+
+        # Repaint each area from the bottom up, clipped to the area so that
+        # nothing outside of it is touched
+        sprite_rects = [s.rect for s in sprites]
+        for r in rects:
+            screen.set_clip(r)
+            screen.blit(self.static_layer, self.base_rect)
+            for i in r.collidelistall(sprite_rects):
+                screen.blit(sprites[i].image, sprites[i].rect)
+            for i in r.collidelistall(bullet_rects):
+                screen.blit(bullets.image, bullet_rects[i])
+        screen.set_clip(None)
         #self.draw_sight(screen)
 
-        # For now, just hardcode the entire arena to be redrawn
-        return [self.base_rect]
+        return rects
 
     def draw_sight(self, screen):
         for bot in self.bots.sprites():
@@ -5,17 +5,35 @@ Responsible for all battle logic. Maintains the arena object
 """
 
 # Local imports
+import real.definitions as d
 from arena import Arena
 
+"""
+Names the virtualbot a realbot runs. Remotebots go by the virtualbot they run
+"""
+def _bot_name(vbot):
+    return getattr(vbot, "bot_class", vbot.__class__).__name__
+
 class Battle(object):
 
-    def __init__(self):
+    """
+    IN:  - optional list of (left, top, virtualbot class) tuples giving the
+           bots to fight, see Arena
+         - number of threads virtualbots decide on, see Dispatcher
+         - ms of CPU time each decision may take, or None for no limit
+         - what happens to a bot going over budget, one of d.overrun
+    """
+    def __init__(self, bot_info=None, decision_workers=0, decision_budget=None,
+                 overrun=d.overrun.CONTINUE):
 
         # Initialize arena
-        self.arena = Arena()
+        self.arena = Arena(bot_info, decision_workers, decision_budget,
+                           overrun)
 
         # Initialize other bookkeeping variables
         self.total_elapsed = 0
+        self.ticks = 0
+        self.skipped_ticks = 0
 
     """
     Called once per game tick
@@ -24,6 +42,22 @@ class Battle(object):
     def update(self, events, elapsed):
         self.arena.update(events, elapsed)
         self.total_elapsed += elapsed
+        self.ticks += 1
+
+    """
+    Fast-forwards over ticks in which nothing happens, see Arena.get_idle_ticks
+    OUT: - number of ticks skipped, 0 if the next tick must be a real update
+    """
+    def skip_idle(self, elapsed, max_ticks=None):
+        ticks = self.arena.get_idle_ticks(elapsed)
+        if max_ticks is not None:
+            ticks = min(ticks, max_ticks)
+        if ticks > 0:
+            self.arena.skip_ticks(elapsed, ticks)
+            self.total_elapsed += elapsed * ticks
+            self.ticks += ticks
+            self.skipped_ticks += ticks
+        return ticks
 
     """
     Called once per frame
@@ -31,3 +65,39 @@ class Battle(object):
     """
     def draw(self, screen):
         return self.arena.draw(screen)
+
+    """
+    Called once the battle is over
+    """
+    def close(self):
+        self.arena.close()
+
+    """
+    Summarizes the battle so far
+    OUT: - dict with the number of ticks and milliseconds simulated, how many
+           of those ticks were skipped over, a list of the surviving bots, and
+           how long every bot spent deciding (see get_accounting())
+    """
+    def get_result(self):
+        survivors = []
+        for bot in self.arena.bots.sprites():
+            survivors.append({"eid": bot.eid,
+                              "name": _bot_name(bot.vbot),
+                              "hp": bot.hp,
+                              "ammo": bot.ammo})
+        return {"ticks": self.ticks,
+                "skipped": self.skipped_ticks,
+                "elapsed": self.total_elapsed,
+                "survivors": survivors,
+                "decisions": self.get_accounting()}
+
+    """
+    Reports how much time every bot, dead or alive, spent deciding
+    OUT: - dict mapping each bot's eid to its statistics (see
+           Dispatcher.get_latency()), plus the name of its virtualbot
+    """
+    def get_accounting(self):
+        report = self.arena.dispatcher.get_latency()
+        for eid, stats in report.iteritems():
+            stats["name"] = _bot_name(self.arena.vbots[eid])
+        return report
@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+
+"""
+headless.py
+
+Runs battles without a window. Instead of being paced by the game clock and
+painted every frame, the battle is updated in a tight loop as fast as the CPU
+allows, which is what you want when evaluating bots over many matches.
+
+To run a few matches from the command line:
+
+    python headless.py --matches 10 --max-ticks 15000
+
+Bots look their routes up in a path database instead of searching for them if
+one was built for the map, see pathdb.py:
+
+    python headless.py --pathdb arena.apdb
+"""
+
+# Global imports
+import argparse
+import random
+import time
+
+# Local imports
+import real.definitions as d
+import virtual.pathdatabase as pathdatabase
+from battle import Battle
+
+"""
+A stop condition that ends the match once at most one bot is left standing
+IN:  - Battle being simulated
+OUT: - bool indicating whether the match is over
+"""
+def one_bot_left(battle):
+    return len(battle.arena.bots) <= 1
+
+class Simulation(object):
+
+    """
+    Constructor for Simulation. No pygame window is opened, images are not
+    converted to a display format and there is no frame pacing.
+    IN:  - length of a game tick in ms, i.e. simulated time per update
+         - max number of ticks before the match is called off, or None to
+           run until the stop condition is met
+         - function taking the Battle and returning True once the match is
+           over, or None to always run for max_ticks
+         - bool, whether to jump over ticks in which nothing happens (see
+           Arena.get_idle_ticks). The outcome is the same either way, as
+           long as the stop condition only depends on the state of the arena
+         - number of threads virtualbots decide on, see Dispatcher
+         - ms of CPU time each decision may take, or None for no limit
+         - what happens to a bot going over budget, one of d.overrun
+    """
+    def __init__(self, game_tick=20, max_ticks=None,
+                 stop_condition=one_bot_left, skip_idle=True,
+                 decision_workers=0, decision_budget=None,
+                 overrun=d.overrun.CONTINUE):
+        if max_ticks is None and stop_condition is None:
+            raise ValueError("Simulation needs max_ticks or a stop_condition")
+        self.game_tick = game_tick
+        self.max_ticks = max_ticks
+        self.stop_condition = stop_condition
+        self.skip_idle = skip_idle
+        self.decision_workers = decision_workers
+        self.decision_budget = decision_budget
+        self.overrun = overrun
+
+    """
+    Plays out a whole match
+    IN:  - optional list of (left, top, virtualbot class) tuples giving the
+           bots to fight, see Arena
+    OUT: - dict describing the result, see Battle.get_result()
+    """
+    def run(self, bot_info=None):
+        battle = Battle(bot_info, self.decision_workers, self.decision_budget,
+                        self.overrun)
+        # Remote workers and decision threads must stop even if a tick fails
+        try:
+            while self.max_ticks is None or battle.ticks < self.max_ticks:
+                if self.stop_condition and self.stop_condition(battle):
+                    break
+                if self.skip_idle:
+                    remaining = None
+                    if self.max_ticks is not None:
+                        remaining = self.max_ticks - battle.ticks
+                    if battle.skip_idle(self.game_tick, remaining):
+                        continue
+                battle.update([], self.game_tick)
+        finally:
+            battle.close()
+        return battle.get_result()
+
+"""
+Runs a number of matches and reports their results and how much faster than
+real time they were simulated
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Run headless matches")
+    parser.add_argument("--matches", type=int, default=1)
+    parser.add_argument("--max-ticks", type=int, default=15000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="ms of CPU time each decision may take")
+    parser.add_argument("--overrun", default="CONTINUE",
+                        choices=["CONTINUE", "PENALISE", "KILL"],
+                        help="what happens to a bot going over budget")
+    parser.add_argument("--accounting", action="store_true",
+                        help="report how long every bot spent deciding")
+    parser.add_argument("--pathdb", default=None,
+                        help="path database to look routes up in")
+    args = parser.parse_args()
+
+    if args.pathdb:
+        pathdatabase.load(args.pathdb)
+    if args.seed is not None:
+        random.seed(args.seed)
+    sim = Simulation(max_ticks=args.max_ticks, decision_budget=args.budget,
+                     overrun=getattr(d.overrun, args.overrun))
+    for i in xrange(args.matches):
+        start = time.time()
+        result = sim.run()
+        wall = max(time.time() - start, 1e-6)
+        survivors = ", ".join("{0} ({1} hp)".format(s["name"], s["hp"])
+                              for s in result["survivors"])
+        print "Match {0}: {1} ticks, {2:.1f}x real time, survivors: {3}".format(
+            i+1, result["ticks"], result["elapsed"] / 1000.0 / wall, survivors)
+        if args.accounting:
+            for eid, stats in sorted(result["decisions"].iteritems()):
+                print ("  {name}: {decisions} decisions, "
+                       "{total_cpu_ms:.1f} ms CPU (mean {mean_cpu_ms:.3f}, "
+                       "max {max_cpu_ms:.1f}), {overruns} overruns"
+                       ).format(**stats)
+
+if __name__ == "__main__":
+    main()
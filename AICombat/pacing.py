@@ -0,0 +1,143 @@
+"""
+pacing.py
+
+Decides, frame by frame, how many game ticks to run and whether to paint. The
+game clock hands out real time, and every game tick uses up a fixed amount of
+it. If updating the battle takes longer than the time it simulates, the owed
+time only grows, and a loop that always pays it back in full never gets to
+paint again. The Pacer prevents this with:
+
+- A catch-up budget: at most max_catch_up ticks, and no more ticks once
+  max_update_time seconds have been spent updating, per frame
+- Render skipping: while still behind, up to max_render_skip frames in a row
+  are not painted, so that their time goes to updates instead
+- Time dilation: if it is still behind after that, the owed time is dropped,
+  so the game runs slower than real time instead of freezing
+
+It also keeps live metrics on how the game is keeping up.
+"""
+
+# Global imports
+import time
+
+class Pacer(object):
+
+    """
+    IN:  - length of a game tick in ms
+         - max number of ticks to run per frame
+         - max seconds to spend updating per frame
+         - max number of frames in a row to not paint while catching up
+         - bool, whether to drop owed time that can't be caught up with
+    """
+    def __init__(self, game_tick, max_catch_up=5, max_update_time=0.05,
+                 max_render_skip=1, dilate=True):
+        self.game_tick = game_tick
+        self.max_catch_up = max_catch_up
+        self.max_update_time = max_update_time
+        self.max_render_skip = max_render_skip
+        self.dilate = dilate
+
+        # Pacing state
+        self.backlog = 0
+        self.frame_updates = 0
+        self.frame_update_time = 0.0
+        self.render_skips = 0
+
+        # Running totals
+        self.dropped_ticks = 0
+        self.skipped_frames = 0
+
+        # Metrics over the current measuring window, see get_metrics()
+        self.window_start = time.time()
+        self.window_ticks = 0
+        self.window_frames = 0
+        self.window_update_time = 0.0
+        self.window_draw_time = 0.0
+        self.metrics = {"update_ms": 0.0,
+                        "draw_ms": 0.0,
+                        "tps": 0.0,
+                        "fps": 0.0,
+                        "dropped_ticks": 0,
+                        "skipped_frames": 0}
+
+    """
+    Called at the start of every frame
+    IN:  - ms of real time that passed since the last frame
+    """
+    def start_frame(self, elapsed):
+        self.backlog += elapsed
+        self.frame_updates = 0
+        self.frame_update_time = 0.0
+
+    """
+    OUT: - bool indicating whether to run another tick this frame
+    """
+    def should_update(self):
+        return (self.backlog >= self.game_tick and
+                self.frame_updates < self.max_catch_up and
+                self.frame_update_time < self.max_update_time)
+
+    """
+    Called after every tick
+    IN:  - seconds the update took
+    """
+    def end_update(self, duration):
+        self.backlog -= self.game_tick
+        self.frame_updates += 1
+        self.frame_update_time += duration
+        self.window_ticks += 1
+        self.window_update_time += duration
+
+    """
+    Called once the frame's ticks are done
+    OUT: - bool indicating whether to paint this frame
+    """
+    def should_draw(self):
+        if self.backlog >= self.game_tick:
+            # Still behind: give the next frame's time to updates instead
+            if self.render_skips < self.max_render_skip:
+                self.render_skips += 1
+                self.skipped_frames += 1
+                return False
+            # Can't catch up: let game time fall behind real time
+            if self.dilate:
+                dropped = self.backlog // self.game_tick
+                self.dropped_ticks += dropped
+                self.backlog -= dropped * self.game_tick
+        self.render_skips = 0
+        return True
+
+    """
+    Called after painting
+    IN:  - seconds the painting took
+    """
+    def end_draw(self, duration):
+        self.window_frames += 1
+        self.window_draw_time += duration
+
+    """
+    Returns the metrics measured over the last completed window, starting a
+    new window if the current one is long enough
+    IN:  - seconds each measuring window lasts
+    OUT: - dict of average ms per update and per paint, ticks and frames per
+           second, and total dropped ticks and skipped frames
+    """
+    def get_metrics(self, window=1.0):
+        now = time.time()
+        span = now - self.window_start
+        if span >= window:
+            ticks = max(self.window_ticks, 1)
+            frames = max(self.window_frames, 1)
+            self.metrics = {
+                "update_ms": self.window_update_time * 1000 / ticks,
+                "draw_ms": self.window_draw_time * 1000 / frames,
+                "tps": self.window_ticks / span,
+                "fps": self.window_frames / span,
+                "dropped_ticks": self.dropped_ticks,
+                "skipped_frames": self.skipped_frames}
+            self.window_start = now
+            self.window_ticks = 0
+            self.window_frames = 0
+            self.window_update_time = 0.0
+            self.window_draw_time = 0.0
+        return self.metrics
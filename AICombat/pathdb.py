@@ -0,0 +1,151 @@
+#! /usr/bin/env python
+
+"""
+pathdb.py
+
+Builds the path database of a map (see virtual/pathdatabase.py) and reports
+how big it is and how fast it answers, next to A*. By default the map is the
+stock arena; --size generates a larger square map with random walls instead.
+
+To build the database of the stock arena and save it:
+
+    python pathdb.py --out arena.apdb
+
+Bots then look their routes up in it once it is loaded, e.g.:
+
+    python headless.py --pathdb arena.apdb
+"""
+
+# Global imports
+import argparse
+import random
+import sys
+import time
+
+# Local imports
+import pygame
+import real.definitions as d
+import virtual.pathdatabase as pathdatabase
+from arena import Arena
+from real.realbot import Realbot
+from virtual.astar import find_path
+from virtual.navmap import NavMap
+
+"""
+Generates a square map with random walls, about one wall per 8000 square
+pixels, each a 10 to 30 pixel thick segment running across or down
+IN:  - int, width and height of the map
+     - random.Random to draw from
+OUT: - tuple of pygame.Rect representing the map, and list of pygame.Rect
+       representing the walls
+"""
+def generate_map(size, rng):
+    walls = []
+    for _ in xrange(size * size // 8000):
+        thickness = rng.randrange(10, 30)
+        length = rng.randrange(40, 200)
+        if rng.random() < 0.5:
+            width, height = thickness, length
+        else:
+            width, height = length, thickness
+        walls.append(pygame.Rect(rng.randrange(size), rng.randrange(size),
+                                 width, height))
+    return pygame.Rect(0, 0, size, size), walls
+
+"""
+IN:  - list of points to follow
+     - direction the bot starts out facing
+OUT: - int, ms it takes to follow the path, walking and turning
+"""
+def path_duration(path, direction):
+    duration = 0
+    for a, b in zip(path, path[1:]):
+        duration += (abs(a[0] - b[0]) + abs(a[1] - b[1])) * d.duration.WALK
+        for step_dir in xrange(4):
+            if ((b[0] - a[0]) * d.DX[step_dir] > 0 or
+                (b[1] - a[1]) * d.DY[step_dir] > 0):
+                turns = (direction - step_dir) % 4
+                duration += min(turns, 4 - turns) * d.duration.TURN
+                direction = step_dir
+    return duration
+
+"""
+Builds a path database, then times lookups and route queries on random pairs
+of connected positions
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Build a path database")
+    parser.add_argument("--size", type=int, default=None,
+                        help="generate a map this wide and high instead of "
+                             "using the stock arena")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the generated map and the queries")
+    parser.add_argument("--out", default=None,
+                        help="file to save the database to")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="number of route queries to time")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.size is None:
+        arena = Arena(bot_info=[])
+        navmap = NavMap(arena.body, [w.body for w in arena.walls.sprites()],
+                        Realbot.SIZE)
+    else:
+        navmap = NavMap(*generate_map(args.size, rng), size=Realbot.SIZE)
+
+    def progress(done, count):
+        sys.stderr.write("\r{0}/{1} waypoints".format(done, count))
+        if done == count:
+            sys.stderr.write("\n")
+
+    start = time.time()
+    database = pathdatabase.build(navmap, progress)
+    built = time.time() - start
+    if args.out:
+        database.save(args.out)
+
+    # Every waypoint could hold a 4 bit mask for every other waypoint
+    waypoints = database.columns * database.rows
+    raw = waypoints * waypoints // 2
+    print "Map {0}x{1}, {2} waypoints, built in {3:.1f} s".format(
+        navmap.width, navmap.height, waypoints, built)
+    print "Size: {0} bytes in {1} runs, {2:.1f}% of {3} uncompressed".format(
+        database.get_size(), len(database.runs),
+        100.0 * database.get_size() / max(raw, 1), raw)
+
+    queries = []
+    while len(queries) < args.queries:
+        a = navmap.random_position(rng)
+        b = navmap.random_position(rng)
+        if a is None:
+            break
+        if a != b and navmap.is_connected(a, b):
+            queries.append((a, b, rng.randrange(4)))
+    if not queries:
+        return
+
+    pairs = [(rng.randrange(waypoints), rng.randrange(waypoints))
+             for _ in xrange(10000)]
+    start = time.time()
+    for source, target in pairs:
+        database.get_moves(source, target)
+    lookup = (time.time() - start) / len(pairs) * 1e6
+    print "First move lookup: {0:.2f} us".format(lookup)
+
+    start = time.time()
+    looked_up = [database.find_path(navmap, *q) for q in queries]
+    database_ms = (time.time() - start) / len(queries) * 1e3
+    start = time.time()
+    searched = [find_path(navmap, *q) for q in queries]
+    search_ms = (time.time() - start) / len(queries) * 1e3
+    ratios = sorted(float(path_duration(p, q[2])) / path_duration(s, q[2])
+                    for p, s, q in zip(looked_up, searched, queries) if p and s)
+    print ("Route query: {0:.3f} ms vs {1:.3f} ms for A*, {2} of {3} found "
+           "({4} by A*), {5:.3f}x as long to follow as A*'s (median)").format(
+        database_ms, search_ms, sum(p is not None for p in looked_up),
+        len(queries), sum(bool(s) for s in searched),
+        ratios[len(ratios) // 2] if ratios else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+bulletengine.py
+
+Keeps every bullet in flight. Instead of one sprite per bullet, each updated
+through a method call of its own, the engine stores bullets as parallel lists
+(one list per attribute, one index per bullet) and steps, expires and hit tests
+all of them in a single pass per tick, without a Rect or a method call per
+bullet, so the arena can carry thousands of bullets. The slots of dead bullets
+are reused by new ones, so a match that keeps firing at a steady rate stops
+allocating once it has as many slots as it ever has bullets in flight.
+
+Bullets are not entities: they have no eid, no sprite and no image of their
+own. Painting them is left to the arena, which asks the engine where the
+bullets are (see get_rects()).
+"""
+
+# Global imports
+import pygame
+
+# Local imports
+import real.definitions as d
+import utils.geometry as g
+from utils.resource import load_image
+
+class BulletEngine(object):
+
+    SIZE = (5, 5)
+    SPEED = 6
+    DMG = 15
+    IMAGE_PATH = "img/bullet.png"
+
+    def __init__(self):
+
+        # One entry per bullet slot. The first count slots hold the bullets
+        # in flight, in the order they were fired; the rest are free slots
+        # left behind by earlier bullets, reused by later ones
+        self.count = 0
+        self.left = []
+        self.top = []
+        self.vx = []
+        self.vy = []
+        self.max_dist = []
+        self.dmg = []
+        self.origin = []
+
+        # Where every bullet was last painted, or None if it wasn't yet, and
+        # where bullets that have since disappeared were painted
+        self.drawn = []
+        self.vacated = []
+
+        # Shared image of a bullet, loaded once painting starts
+        self.image = None
+        self.offset = (0, 0)
+
+        # Scratch rect for table and collision lookups
+        self.scratch = pygame.Rect(0, 0, self.SIZE[0], self.SIZE[1])
+
+        # Bullet slots added since the last begin_tick()
+        self.slot_growth = 0
+
+    """
+    OUT: - int, number of bullets in flight
+    """
+    def __len__(self):
+        return self.count
+
+    """
+    Resets the count of slots added, see Arena.get_bullet_slot_growth()
+    """
+    def begin_tick(self):
+        self.slot_growth = 0
+
+    """
+    Fires a new bullet, in a free slot if there is one
+    IN:  - realbot that fired the bullet, which the bullet can't hit
+         - CollisionTable of the walls for bullet-sized bodies
+         - direction the bullet flies in
+         - left and top of the bullet's position
+    """
+    def fire(self, origin, wall_table, direction, left, top):
+        vx = self.SPEED * d.DX[direction]
+        vy = self.SPEED * d.DY[direction]
+        body = self.scratch
+        body.topleft = (left, top)
+        max_dist = wall_table.predict(body, vx, vy)
+        i = self.count
+        if i == len(self.left):
+            for column in (self.left, self.top, self.vx, self.vy,
+                           self.max_dist, self.dmg, self.origin, self.drawn):
+                column.append(None)
+            self.slot_growth += 1
+        self.left[i] = left
+        self.top[i] = top
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.max_dist[i] = max_dist
+        self.dmg[i] = self.DMG
+        self.origin[i] = origin
+        self.drawn[i] = None
+        self.count += 1
+
+    """
+    Called once per game tick, after the bots have moved and arena.bot_index
+    has been rebuilt. Moves every bullet, and removes the ones that run out of
+    range or strike a bot, dealing their damage.
+    """
+    def update(self, arena, elapsed):
+        left, top, vx, vy = self.left, self.top, self.vx, self.vy
+        max_dist, dmg, origin = self.max_dist, self.dmg, self.origin
+        w, h = self.SIZE
+        speed = self.SPEED
+        find_first = arena.bot_index.find_first
+        dead = False
+
+        for i in xrange(self.count):
+
+            # Move. A negative max_dist marks the bullet for the sweep
+            x = left[i] + vx[i]
+            y = top[i] + vy[i]
+            left[i] = x
+            top[i] = y
+            max_dist[i] -= speed
+            if max_dist[i] < 0:
+                dead = True
+                continue
+
+            # Strike the first bot (in index order) it overlaps
+            struck = find_first(x, y, w, h, origin[i])
+            if struck is not None:
+                struck.hit(dmg[i])
+                max_dist[i] = -1
+                dead = True
+
+        if dead:
+            self.sweep()
+
+    """
+    Removes the bullets marked dead by update(). The survivors are moved down
+    in place, keeping their order, and the slots freed at the end are kept
+    for later bullets, so nothing is allocated.
+    """
+    def sweep(self):
+        columns = (self.left, self.top, self.vx, self.vy, self.max_dist,
+                   self.dmg, self.origin, self.drawn)
+        max_dist, drawn = self.max_dist, self.drawn
+        kept = 0
+        for i in xrange(self.count):
+            if max_dist[i] < 0:
+                if drawn[i] is not None:
+                    self.vacated.append(drawn[i])
+                continue
+            if kept != i:
+                for column in columns:
+                    column[kept] = column[i]
+            kept += 1
+
+        # Don't keep dead bots' realbots alive through free slots
+        for i in xrange(kept, self.count):
+            self.origin[i] = None
+            self.drawn[i] = None
+        self.count = kept
+
+    """
+    Counterpart of Entity.get_idle_ticks() for all bullets at once. A bullet
+    is idle until it either runs out of range or reaches a bot, both of which
+    can be predicted from its straight flight as long as the bots stay put.
+    """
+    def get_idle_ticks(self, arena, elapsed):
+        bots = arena.bots.sprites()
+        body = self.scratch
+        speed = self.SPEED
+        targets = {}
+        idle = g.POSINF
+        for i in xrange(self.count):
+
+            # Tick at which max_dist drops below zero
+            if self.max_dist[i] == g.POSINF:
+                expire = g.POSINF
+            else:
+                expire = self.max_dist[i] // speed + 1
+
+            # Tick at which the bullet first overlaps a bot
+            origin = self.origin[i]
+            bodies = targets.get(origin)
+            if bodies is None:
+                bodies = [bot.body for bot in bots if bot is not origin]
+                targets[origin] = bodies
+            body.topleft = (self.left[i], self.top[i])
+            dist = g.predict_collision(body, bodies, self.vx[i], self.vy[i])
+            if dist == g.POSINF:
+                strike = g.POSINF
+            else:
+                strike = dist // speed + 1
+
+            idle = min(idle, expire - 1, strike - 1)
+            if idle <= 0:
+                return 0
+        return idle
+
+    """
+    Counterpart of Entity.skip_ticks() for all bullets at once
+    """
+    def skip_ticks(self, arena, elapsed, ticks):
+        left, top, vx, vy = self.left, self.top, self.vx, self.vy
+        max_dist = self.max_dist
+        travel = self.SPEED * ticks
+        for i in xrange(self.count):
+            left[i] += vx[i] * ticks
+            top[i] += vy[i] * ticks
+            max_dist[i] -= travel
+
+    """
+    Finds where every bullet is to be painted. Loads the bullet image on
+    first use, which needs a display.
+    OUT: - list of pygame.Rect, in bullet order
+    """
+    def get_rects(self):
+        if self.image is None:
+            self.image, rect = load_image(self.IMAGE_PATH)
+            # Centered on the body, as in Entity.center()
+            self.offset = (self.SIZE[0]/2 - rect.width/2,
+                           self.SIZE[1]/2 - rect.height/2)
+        ox, oy = self.offset
+        w, h = self.image.get_size()
+        return [pygame.Rect(self.left[i] + ox, self.top[i] + oy, w, h)
+                for i in xrange(self.count)]
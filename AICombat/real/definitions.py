@@ -28,6 +28,13 @@ action = Enum('WAIT',
               'TURN',
               'SHOOT')
 
+# What happens when a virtualbot takes longer to decide than its budget allows
+# (see Dispatcher): its decision is dropped, as if it had chosen CONTINUE, and
+# the bot may in addition lose hp or be killed outright
+overrun = Enum('CONTINUE',
+               'PENALISE',
+               'KILL')
+
 # Legal cardinal directions
 direction = Enum('RIGHT',
                  'UP',
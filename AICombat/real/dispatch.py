@@ -0,0 +1,227 @@
+"""
+dispatch.py
+
+The decision stage of a game tick. Once every bot has moved, the ones ready
+for a new action each ask their virtualbot what to do. A slow virtualbot (say,
+one planning a long path) would hold up every bot after it if they were asked
+one after another, so the Dispatcher can instead ask them all at once on a pool
+of threads.
+
+A tick's decisions happen in three steps:
+1. The status of every ready bot is compiled, in bot order
+2. Every virtualbot picks an action, possibly concurrently
+3. The actions are carried out, in bot order
+Since nothing a virtualbot decides affects the world until step 3, and every
+virtualbot has its own random number generator, the outcome doesn't depend on
+whether the virtualbots ran concurrently or in which order they finished.
+
+The Dispatcher also measures how long every virtualbot takes to decide, and can
+hold them to a budget of CPU time per decision. When virtualbots are asked one
+after another on the main thread, a decision that runs over is interrupted by
+a profiling timer (SIGPROF), so no virtualbot can stall a tick for much longer
+than the budget. The timer only counts CPU time in whole scheduler ticks, so it
+is given some slack, and decisions that return by themselves are judged on the
+exact CPU time they took. An interrupt landing while the virtualbot updates
+state shared with other bots is held back until the update is done (see
+utils/interrupts.py). On threads, or where the timer isn't available, a
+decision can only be judged once it returns. Either way an overrun decision is
+dropped, and the bot may be penalised further, see d.overrun.
+"""
+
+# Global imports
+import signal
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Local imports
+import real.definitions as d
+from utils.interrupts import critical
+
+"""
+Raised inside a virtualbot's get_action() once it has used up its budget. It
+is a BaseException so that virtualbots catching Exception don't swallow it.
+"""
+class DecisionOverrun(BaseException):
+    pass
+
+"""
+Signal handler for the profiling timer armed around a decision. Shared state
+being updated is left whole, see utils/interrupts.py
+"""
+def _interrupt(signum, frame):
+    critical.raise_when_safe(DecisionOverrun())
+
+"""
+OUT: - seconds of CPU time used by the process so far. Where possible this
+       comes from getrusage(), since on Linux time.clock() only counts whole
+       scheduler ticks while a profiling timer is armed
+"""
+def _cpu_time():
+    if resource is None:
+        return time.clock()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+"""
+Asks a virtualbot for an action and times it. Module-level so that the thread
+pool can run it.
+IN:  - tuple of (virtualbot, status dict)
+OUT: - tuple of (decision dict, seconds it took, seconds of CPU time it took,
+       bool indicating whether it was interrupted)
+"""
+def timed_action(job):
+    vbot, status = job
+    start, start_cpu = time.time(), _cpu_time()
+    decision = vbot.get_action(status)
+    return decision, time.time() - start, _cpu_time() - start_cpu, False
+
+class Dispatcher(object):
+
+    # Hp a bot loses for every overrun decision under d.overrun.PENALISE
+    PENALTY = 10
+
+    # Ms the profiling timer allows on top of the budget, enough for a few
+    # scheduler ticks
+    TIMER_SLACK = 10
+
+    """
+    IN:  - number of threads to ask virtualbots on, or 0 to ask them one
+           after another on the calling thread
+         - ms of CPU time each decision may take, or None for no limit
+         - what happens to a bot going over budget, one of d.overrun
+    """
+    def __init__(self, workers=0, budget=None, overrun=d.overrun.CONTINUE):
+        self.workers = workers
+        self.budget = budget
+        self.overrun = overrun
+        self.pool = None
+        self.latency = {}
+
+        # The timer can only be used from the main thread, and only where
+        # signal.setitimer() exists
+        self.interruptible = (
+            budget is not None and not workers and
+            hasattr(signal, "setitimer") and
+            isinstance(threading.current_thread(), threading._MainThread))
+        self.old_handler = None
+
+    """
+    Lets every ready bot decide on and start its next action
+    IN:  - Arena
+         - list of realbots ready for a decision, in bot order
+         - ms elapsed this tick
+    """
+    def decide(self, arena, bots, elapsed):
+        jobs = [(bot.vbot, bot.compile_status(arena, elapsed)) for bot in bots]
+        if self.workers and len(jobs) > 1:
+            if self.pool is None:
+                self.pool = ThreadPool(self.workers)
+            results = self.pool.map(timed_action, jobs)
+        elif self.interruptible:
+            results = map(self._limited_action, jobs)
+        else:
+            results = map(timed_action, jobs)
+        for bot, (decision, duration, cpu, interrupted) in zip(bots, results):
+            self._record(bot, duration, cpu)
+            if interrupted or self._over_budget(duration, cpu):
+                self._penalise(bot)
+                continue
+            bot.process_decision(arena, decision)
+
+    """
+    OUT: - dict mapping each bot's eid to a dict of its number of decisions
+           and overruns, and the total, mean, max and latest ms spent
+           deciding, both in real and CPU time
+    """
+    def get_latency(self):
+        report = {}
+        for eid, stats in self.latency.iteritems():
+            report[eid] = dict(stats)
+            report[eid]["mean_ms"] = stats["total_ms"] / stats["decisions"]
+            report[eid]["mean_cpu_ms"] = (stats["total_cpu_ms"] /
+                                          stats["decisions"])
+        return report
+
+    """
+    Shuts down the thread pool, if any, and puts back the SIGPROF handler
+    """
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.old_handler is not None:
+            signal.signal(signal.SIGPROF, self.old_handler)
+            self.old_handler = None
+
+    """
+    Like timed_action(), but interrupts the virtualbot once it has used up
+    its budget of CPU time
+    """
+    def _limited_action(self, job):
+        if self.old_handler is None:
+            self.old_handler = signal.signal(signal.SIGPROF, _interrupt)
+        vbot, status = job
+        start, start_cpu = time.time(), _cpu_time()
+        # The timer fires once, so the interrupt can also land after
+        # get_action() returned but before the timer was disarmed
+        try:
+            try:
+                signal.setitimer(signal.ITIMER_PROF,
+                                 (self.budget + self.TIMER_SLACK) / 1000.0)
+                decision = vbot.get_action(status)
+            finally:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+                critical.discard_pending()
+            interrupted = False
+        except DecisionOverrun:
+            decision, interrupted = None, True
+        return decision, time.time() - start, _cpu_time() - start_cpu, \
+               interrupted
+
+    """
+    Judges a decision that ran to completion against the budget. On threads,
+    the process's CPU time includes every other thread's, so the real time a
+    decision took is used instead.
+    """
+    def _over_budget(self, duration, cpu):
+        if self.budget is None:
+            return False
+        if self.workers:
+            return duration * 1000 > self.budget
+        return cpu * 1000 > self.budget
+
+    """
+    Punishes a bot whose decision went over budget, see d.overrun
+    """
+    def _penalise(self, bot):
+        self.latency[bot.eid]["overruns"] += 1
+        if self.overrun == d.overrun.PENALISE:
+            bot.hit(self.PENALTY)
+        elif self.overrun == d.overrun.KILL:
+            bot.hit(bot.hp)
+
+    """
+    Adds a decision's duration to its bot's statistics
+    """
+    def _record(self, bot, duration, cpu):
+        ms = duration * 1000
+        cpu_ms = cpu * 1000
+        stats = self.latency.get(bot.eid)
+        if stats is None:
+            stats = {"decisions": 0, "overruns": 0,
+                     "total_ms": 0.0, "max_ms": 0.0,
+                     "total_cpu_ms": 0.0, "max_cpu_ms": 0.0}
+            self.latency[bot.eid] = stats
+        stats["decisions"] += 1
+        stats["total_ms"] += ms
+        stats["max_ms"] = max(stats["max_ms"], ms)
+        stats["last_ms"] = ms
+        stats["total_cpu_ms"] += cpu_ms
+        stats["max_cpu_ms"] = max(stats["max_cpu_ms"], cpu_ms)
+        stats["last_cpu_ms"] = cpu_ms
@@ -10,7 +10,7 @@ import pygame
 
 # Local imports
 import real.definitions as d
-from utils.resource import load_image
+from utils.resource import image_key, load_image
 
 class Entity(pygame.sprite.Sprite):
 
@@ -42,7 +42,14 @@ class Entity(pygame.sprite.Sprite):
         self.body = body
         self.direction = direction
 
+        # Track where the sprite was last painted, and whether it has moved
+        # or changed since then (see Arena.draw)
+        self.drawn_rect = None
+        self.dirty = True
+
         # Attach image, if given
+        self.image_path = None
+        self.image_key = None
         self.base_image = None
         self.image = None
         self.base_rect = None
@@ -52,9 +59,12 @@ class Entity(pygame.sprite.Sprite):
 
     """
     Given an image path, loads the image as a pygame Surface and adjust the
-    sprite drawing variables
+    sprite drawing variables. The base image is shared by every entity using
+    the same path, see load_image()
     """
     def set_image(self, image_path):
+        self.image_path = image_path
+        self.image_key = image_key(image_path)
         self.base_image, self.base_rect = load_image(image_path)
         self.image = self.base_image
         self.rect = self.image.get_rect()
@@ -67,6 +77,23 @@ class Entity(pygame.sprite.Sprite):
     def update(self, arena, elapsed):
         pass
 
+    """
+    Used by the scheduler of headless runs to jump over stretches of ticks in
+    which nothing interesting happens. Returns how many of the upcoming ticks
+    the entity would spend without affecting anything but itself, given that
+    no bot moves in the meantime.
+    A basic entity is never skipped over
+    """
+    def get_idle_ticks(self, arena, elapsed):
+        return 0
+
+    """
+    Fast-forwards through ticks promised idle by get_idle_ticks(), leaving the
+    entity exactly as if update() had been called that many times
+    """
+    def skip_ticks(self, arena, elapsed, ticks):
+        pass
+
     """
     Called by arena to see if entity can be safely removed
     A basic entity is immortal
@@ -88,6 +115,7 @@ class Entity(pygame.sprite.Sprite):
     Utility function that centers physical and sprite positions
     """
     def center(self):
+        self.dirty = True
         self.rect = self.image.get_rect()
         offset_left = self.body.width/2 - self.rect.width/2
         offset_top = self.body.height/2 - self.rect.height/2
@@ -98,6 +126,7 @@ class Entity(pygame.sprite.Sprite):
     Utility function to translate position
     """
     def move(self, x=0, y=0):
+        self.dirty = True
         self.rect.top += y
         self.rect.left += x
         self.body.top += y
@@ -0,0 +1,108 @@
+"""
+perception.py
+
+Works out once per tick which bots can see each other. Every deciding bot
+needs to know which other bots are within its sight range, which is an
+all-pairs problem. Instead of every bot checking every other bot on its own,
+the arena computes the pairwise distances between bot centers once, after the
+bots have moved, and every bot reads its visible set from here.
+
+The public information of a bot (see Entity.get_info()) is also built at most
+once per tick and shared by everyone who sees it.
+"""
+
+# Global imports
+import math
+
+# Local imports
+import utils.geometry as g
+
+class Perception(object):
+
+    def __init__(self):
+        self.bots = []
+        self.rows = {}
+        self.centers = []
+        self.max_rads = []
+        self.distances = []
+        self.visible = []
+        self.infos = []
+
+    """
+    Recomputes distances and visibility between all bots. Must be called
+    after the bots have moved and before any of them decide. The lists filled
+    in are kept from one tick to the next, and only rebuilt when the number of
+    bots changes.
+    IN:  - list of realbots in the arena
+    """
+    def update(self, bots):
+        n = len(bots)
+        self.bots = bots
+        rows = self.rows
+        rows.clear()
+        for i, bot in enumerate(bots):
+            rows[bot] = i
+        if len(self.distances) != n:
+            self.centers = [None] * n
+            self.max_rads = [0] * n
+            self.distances = [[0.0] * n for i in xrange(n)]
+            self.visible = [[] for i in xrange(n)]
+            self.infos = [None] * n
+        centers = self.centers
+        max_rads = self.max_rads
+        distances = self.distances
+        infos = self.infos
+        for i in xrange(n):
+            body = bots[i].body
+            centers[i] = g.get_center(body)
+            max_rads[i] = g.get_max_rad(body)
+            infos[i] = None
+
+        # Pairwise distances between bot centers. The matrix is symmetric, so
+        # only half of it needs computing, and the diagonal stays 0
+        for i in xrange(n):
+            cx, cy = centers[i]
+            row = distances[i]
+            for j in xrange(i+1, n):
+                dist = math.sqrt((cx-centers[j][0])**2 + (cy-centers[j][1])**2)
+                row[j] = dist
+                distances[j][i] = dist
+
+        # A bot sees another if the other's body collides with its sight
+        # circle. This is the same test as g.collide_rect_circle(), reusing
+        # the distances from above
+        for i in xrange(n):
+            r = bots[i].sight_range
+            cx, cy = centers[i]
+            left, top, right, bottom = cx - r, cy - r, cx + r, cy + r
+            row = distances[i]
+            seen = self.visible[i]
+            del seen[:]
+            for j in xrange(n):
+                if j == i:
+                    continue
+                body = bots[j].body
+                if (body.left < right and body.right > left and
+                    body.top < bottom and body.bottom > top and
+                    row[j] <= r + max_rads[j]):
+                    seen.append(j)
+
+    """
+    IN:  - realbot
+    OUT: - list of the info dicts of every bot it can see
+    """
+    def get_visible(self, bot):
+        infos = self.infos
+        seen = []
+        for j in self.visible[self.rows[bot]]:
+            if infos[j] is None:
+                infos[j] = self.bots[j].get_info()
+            seen.append(infos[j])
+        return seen
+
+    """
+    IN:  - two realbots
+    OUT: - float, the distance between their centers
+    """
+    def get_distance(self, bot1, bot2):
+        return self.distances[self.rows[bot1]][self.rows[bot2]]
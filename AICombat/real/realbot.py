@@ -15,7 +15,9 @@ import pygame
 import real.definitions as d
 import utils.geometry as g
 from real.fighter import Fighter
-from real.bullet import Bullet
+from real.bulletengine import BulletEngine
+from utils.collisiontable import get_collision_table
+from utils.resource import rotate_image
 
 class Realbot(Fighter):
 
@@ -41,6 +43,10 @@ class Realbot(Fighter):
         self.walls.append(pygame.Rect(-1, 0, 1, height+1))
         self.walls.append(pygame.Rect(0, height, width+1, 1))
         self.walls.append(pygame.Rect(width, -1, 1, height+1))
+        ### Walls never move, so look up distances to them in shared tables
+        self.wall_table = get_collision_table(self.walls, Realbot.SIZE)
+        self.bullet_table = get_collision_table(self.walls,
+                                                BulletEngine.SIZE)
 
     """
     Called by arena to attach a virtualbot to this realbot
@@ -49,27 +55,6 @@ class Realbot(Fighter):
         self.vbot = vbot
         self.set_image(vbot.image_path)
 
-    """
-    Called once per game loop iteration
-    If the realbot is executing an action, it will continue executing it.
-    Once it is done, it will ask the virtualbot for the next move.
-    """
-    def update(self, arena, elapsed):
-
-        # Update state and return if not ready for next decision
-        if not self.update_state(arena, elapsed):
-            return
-
-        # Compile status information to tell the virtualbot
-        status = self.compile_status(arena, elapsed)
-
-        # Ask virtualbot for what to do next
-        decision = self.vbot.get_action(status)
-
-        # Process decision
-        self.process_decision(arena, decision)
-
-
     """
     Given the virtualbot's decision, adjust the state accordingly
     """
@@ -93,9 +78,9 @@ class Realbot(Fighter):
             if ("distance" not in decision or
                 decision["distance"] <= 0):
                 return
-            max_distance = g.predict_collision(self.body, self.walls,
-                                               d.DX[self.direction],
-                                               d.DY[self.direction])
+            max_distance = self.wall_table.predict(self.body,
+                                                   d.DX[self.direction],
+                                                   d.DY[self.direction])
             self.state["max_distance"] = max_distance
             self.state["action"] = d.action.WALK
             self.state["distance"] = decision["distance"]
@@ -114,14 +99,18 @@ class Realbot(Fighter):
         # If shoot, toggle action state and materialize the bullet
         elif decision['action'] == d.action.SHOOT:
             # Center bullet on bot's position
-            bullet_body = g.scale(self.body, Bullet.SIZE)
-            bullet = Bullet(self, self.walls, self.direction, bullet_body.left, bullet_body.top)
-            arena.others.add(bullet)
+            bullet_body = g.scale(self.body, BulletEngine.SIZE)
+            arena.bullets.fire(self, self.bullet_table, self.direction,
+                               bullet_body.left, bullet_body.top)
             self.state["action"] = d.action.SHOOT
             self.state["cooldown"] = d.duration.SHOOT
 
     """
-    Forwards the realbot's state, e.g. move forward if walking.
+    Called once per game loop iteration
+    Forwards the realbot's state, e.g. move forward if walking. Once the
+    realbot is ready for its next decision, the arena asks the virtualbot
+    what to do (see Dispatcher) and hands the answer to process_decision()
+    OUT: - bool indicating whether the realbot is ready for its next decision
     """
     def update_state(self, arena, elapsed):
 
@@ -141,7 +130,8 @@ class Realbot(Fighter):
                 dTheta = (self.state["next"] - self.direction)*90
                 dTheta = dTheta if abs(dTheta) != 270 else -dTheta/3
                 theta = int(self.direction*90 + dTheta*progress)
-                self.image = pygame.transform.rotate(self.base_image, theta)
+                self.image = rotate_image(self.base_image, theta,
+                                          self.image_key)
                 self.center()
                 self.state["cooldown"] = cooldown
                 return False
@@ -149,7 +139,8 @@ class Realbot(Fighter):
             else:
                 self.direction = self.state["next"]
                 theta = self.direction*90
-                self.image = pygame.transform.rotate(self.base_image, theta)
+                self.image = rotate_image(self.base_image, theta,
+                                          self.image_key)
                 self.center()
                 self.state = {"action": d.action.WAIT}
 
@@ -187,6 +178,22 @@ class Realbot(Fighter):
 
         return True
 
+    """
+    Override of Entity's get_idle_ticks(). A turning or recoiling realbot
+    neither moves nor decides until its cooldown runs out.
+    """
+    def get_idle_ticks(self, arena, elapsed):
+        if self.state["action"] in (d.action.TURN, d.action.SHOOT):
+            # Ceiling division: the tick at which the cooldown reaches zero
+            return -(-self.state["cooldown"] // elapsed) - 1
+        return 0
+
+    """
+    Override of Entity's skip_ticks()
+    """
+    def skip_ticks(self, arena, elapsed, ticks):
+        self.update_state(arena, elapsed * ticks)
+
     """
     Override of Entity's get_info() to provide public information about the bot
     """
@@ -213,16 +220,10 @@ class Realbot(Fighter):
         # Environment information
         status["elapsed"] = elapsed
 
-        # Objects of interest in sight range
+        # Objects of interest in sight range, as worked out by the arena for
+        # this tick
         status["objects"] = {}
-        status["objects"]["bots"] = []
-        center = g.get_center(self.body)
-        # Temporary sight method: circle
-        r = self.sight_range
-        sight = pygame.Rect(center[0], center[1], r, r)
-        for entity in arena.bots.sprites():
-            if entity != self and g.collide_rect_circle(entity.body, sight):
-                status["objects"]["bots"].append(entity.get_info())
+        status["objects"]["bots"] = arena.perception.get_visible(self)
         status["objects"]["projectiles"] = []
         status["objects"]["items"] = []
 
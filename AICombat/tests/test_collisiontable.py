@@ -0,0 +1,145 @@
+"""
+test_collisiontable.py
+
+Checks that CollisionTable.predict() gives the same answers as
+g.predict_collision() on a few maps, for bodies the size of a bot and of a
+bullet, positioned at random and right up against (or into) the walls. The
+positions are drawn from a fixed seed, so a failure repeats. To run, from
+the AICombat directory:
+
+    python -m unittest discover -s tests -t .
+"""
+
+# Global imports
+import random
+import unittest
+
+# Local imports
+import pygame
+import utils.geometry as g
+from real.bulletengine import BulletEngine
+from real.realbot import Realbot
+from utils.collisiontable import get_collision_table
+
+# Seed every map is checked with
+SEED = 1
+
+# Random positions checked per map, body size and direction
+SAMPLES = 300
+
+# How far outside the tables random positions go, in pixels
+MARGIN = 40
+
+# Velocities that go in each of the four directions
+VELOCITIES = [(1, 0), (-1, 0), (0, 1), (0, -1), (6, 0), (-6, 0), (0, 6),
+              (0, -6)]
+
+"""
+OUT: - list of pygame.Rect, the walls of the stock arena
+"""
+def stock_walls():
+    return [pygame.Rect(100, 100, 100, 10), pygame.Rect(100, 200, 52, 148),
+            pygame.Rect(0, 30, 100, 10), pygame.Rect(40, 100, 12, 96),
+            pygame.Rect(60, 150, 6, 86), pygame.Rect(200, 0, 20, 96)]
+
+"""
+OUT: - list of pygame.Rect, walls touching, overlapping and nested in each
+       other, and gaps narrower than a bot
+"""
+def crowded_walls():
+    return [pygame.Rect(50, 50, 30, 30), pygame.Rect(80, 50, 30, 30),
+            pygame.Rect(95, 65, 30, 30), pygame.Rect(60, 60, 5, 5),
+            pygame.Rect(50, 90, 75, 1), pygame.Rect(50, 100, 1, 60),
+            pygame.Rect(60, 100, 1, 60), pygame.Rect(130, 40, 10, 200)]
+
+"""
+IN:  - random.Random to draw from
+OUT: - list of pygame.Rect, walls of random size scattered around a small map
+"""
+def random_walls(rng):
+    return [pygame.Rect(rng.randrange(-20, 200), rng.randrange(-20, 200),
+                        rng.randrange(1, 60), rng.randrange(1, 60))
+            for _ in xrange(12)]
+
+class CollisionTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(SEED)
+
+    """
+    Checks every direction for a body at a position against
+    g.predict_collision()
+    IN:  - list of pygame.Rect representing the walls
+         - the CollisionTable of the walls
+         - 2-tuple representing the body size in (width, height)
+         - x and y of the top left corner of the body
+    """
+    def check(self, walls, table, size, x, y):
+        body = pygame.Rect((x, y), size)
+        for vx, vy in VELOCITIES:
+            self.assertEqual(table.predict(body, vx, vy),
+                             g.predict_collision(body, walls, vx, vy),
+                             "{0} moving ({1}, {2}) among {3}".format(
+                                 body, vx, vy, walls))
+
+    """
+    Checks a set of walls for bodies the size of a bot and of a bullet
+    IN:  - list of pygame.Rect representing the walls
+    """
+    def check_walls(self, walls):
+        for size in (Realbot.SIZE, BulletEngine.SIZE):
+            table = get_collision_table(walls, size)
+            self.assertIsNotNone(table.right)
+            w, h = size
+
+            # Anywhere in and around the tables
+            for _ in xrange(SAMPLES):
+                self.check(walls, table, size,
+                           self.rng.randrange(table.x0 - MARGIN,
+                                              table.x0 + table.nx + MARGIN),
+                           self.rng.randrange(table.y0 - MARGIN,
+                                              table.y0 + table.ny + MARGIN))
+
+            # Right at the edges of the tables
+            xs = [table.x0 - 1, table.x0, table.x0 + table.nx - 1,
+                  table.x0 + table.nx]
+            ys = [table.y0 - 1, table.y0, table.y0 + table.ny - 1,
+                  table.y0 + table.ny]
+            for x in xs:
+                for y in ys + [self.rng.randrange(table.y0, table.y0 +
+                                                  table.ny)]:
+                    self.check(walls, table, size, x, y)
+            for y in ys:
+                self.check(walls, table, size,
+                           self.rng.randrange(table.x0, table.x0 + table.nx),
+                           y)
+
+            # Touching, or one pixel into or away from, every side of every
+            # wall
+            for o in walls:
+                xs = [o.left - w - 1, o.left - w, o.left - w + 1,
+                      o.right - 1, o.right, o.right + 1]
+                ys = [o.top - h - 1, o.top - h, o.top - h + 1,
+                      o.bottom - 1, o.bottom, o.bottom + 1]
+                for x in xs:
+                    for y in ys + [self.rng.randrange(o.top - h, o.bottom)]:
+                        self.check(walls, table, size, x, y)
+                for y in ys:
+                    self.check(walls, table, size,
+                               self.rng.randrange(o.left - w, o.right), y)
+
+    def test_stock_arena(self):
+        self.check_walls(stock_walls())
+
+    def test_crowded_walls(self):
+        self.check_walls(crowded_walls())
+
+    def test_random_walls(self):
+        for _ in xrange(5):
+            self.check_walls(random_walls(self.rng))
+
+    def test_single_wall(self):
+        self.check_walls([pygame.Rect(10, 10, 1, 1)])
+
+if __name__ == "__main__":
+    unittest.main()
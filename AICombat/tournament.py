@@ -0,0 +1,159 @@
+#! /usr/bin/env python
+
+"""
+tournament.py
+
+Plays many headless matches in parallel over a pool of worker processes. A
+tournament takes a roster of virtualbot classes, a list of spawn layouts and a
+list of seeds. For every layout, every combination of roster entries that fits
+the layout is played once per seed. Results are handed back as soon as each
+match finishes.
+
+To run the stock bots against each other from the command line:
+
+    python tournament.py --seeds 20
+"""
+
+# Global imports
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+# Local imports
+from headless import Simulation
+from virtual import *
+
+"""
+Plays a single match. This runs inside a worker process, so it has to be a
+module-level function for multiprocessing to be able to pickle it.
+IN:  - tuple of (match number, list of (left, top, virtualbot class), seed,
+       max ticks)
+OUT: - tuple of (match number, result dict, worker pid, seconds spent)
+"""
+def play_match(match):
+    start = time.time()
+    number, bot_info, seed, max_ticks = match
+    random.seed(seed)
+    result = Simulation(max_ticks=max_ticks).run(bot_info)
+    return number, result, os.getpid(), time.time() - start
+
+class Tournament(object):
+
+    """
+    Constructor for Tournament
+    IN:  - list of virtualbot classes to draw contestants from
+         - list of spawn layouts, each a list of (left, top) positions. A
+           layout with n positions hosts matches between n bots
+         - list of seeds, each combination is played once per seed
+         - number of worker processes, defaults to one per core
+         - max number of ticks per match
+    """
+    def __init__(self, roster, layouts, seeds, processes=None,
+                 max_ticks=15000):
+        self.roster = roster
+        self.layouts = layouts
+        self.seeds = seeds
+        self.processes = processes or multiprocessing.cpu_count()
+        self.max_ticks = max_ticks
+
+        # Statistics, filled in while running
+        self.matches_played = 0
+        self.wall_time = 0
+        self.worker_busy = {}
+
+    """
+    A class listed twice in the roster can meet itself, but each lineup is
+    only played once per layout and seed
+    OUT: - list of (match number, bot_info, seed, max ticks) tuples for every
+           match in the tournament
+    """
+    def get_matches(self):
+        matches = []
+        for layout in self.layouts:
+            lineups = set()
+            for lineup in itertools.combinations(self.roster, len(layout)):
+                if lineup in lineups:
+                    continue
+                lineups.add(lineup)
+                bot_info = [(pos[0], pos[1], cls)
+                            for pos, cls in zip(layout, lineup)]
+                for seed in self.seeds:
+                    matches.append((len(matches), bot_info, seed,
+                                    self.max_ticks))
+        return matches
+
+    """
+    Plays every match on the worker pool. This is a generator: results are
+    yielded in the order the matches finish, not in the order they were
+    scheduled.
+    OUT: - yields (match, result dict) for every match, where match is the
+           tuple from get_matches()
+    """
+    def run(self):
+        matches = self.get_matches()
+        self.matches_played = 0
+        self.worker_busy = {}
+        start = time.time()
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for number, result, pid, busy in pool.imap_unordered(play_match,
+                                                                 matches):
+                self.matches_played += 1
+                self.worker_busy[pid] = self.worker_busy.get(pid, 0) + busy
+                self.wall_time = time.time() - start
+                yield matches[number], result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        self.wall_time = time.time() - start
+
+    """
+    OUT: - float, matches finished per second of wall time so far
+    """
+    def get_rate(self):
+        if not self.wall_time:
+            return 0.0
+        return self.matches_played / self.wall_time
+
+    """
+    OUT: - dict mapping each worker pid to the fraction of wall time it spent
+           playing matches
+    """
+    def get_utilisation(self):
+        if not self.wall_time:
+            return {}
+        return dict((pid, busy / self.wall_time)
+                    for pid, busy in self.worker_busy.iteritems())
+
+"""
+Pits the stock bots against each other and prints results as they come in
+"""
+def main():
+    parser = argparse.ArgumentParser(description="Run an AI Combat tournament")
+    parser.add_argument("--seeds", type=int, default=10)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-ticks", type=int, default=15000)
+    args = parser.parse_args()
+
+    roster = [Dumbbot, Navbot, Stalkerbot, Stalkerbot]
+    layouts = [[(10, 100), (350, 250)],
+               [(0, 0), (250, 100), (200, 350)]]
+    tournament = Tournament(roster, layouts, range(args.seeds),
+                            args.processes, args.max_ticks)
+    for match, result in tournament.run():
+        lineup = " vs ".join(cls.__name__ for _, _, cls in match[1])
+        survivors = ", ".join(s["name"] for s in result["survivors"])
+        print "Match {0} ({1}, seed {2}): {3} ticks, survivors: {4}".format(
+            match[0], lineup, match[2], result["ticks"], survivors or "none")
+
+    print "{0} matches at {1:.2f} matches/sec".format(
+        tournament.matches_played, tournament.get_rate())
+    for pid, load in sorted(tournament.get_utilisation().iteritems()):
+        print "Worker {0}: {1:.0%} busy".format(pid, load)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+collisiontable.py
+
+Precomputed answers to g.predict_collision() for static obstacles. For a given
+body size, a CollisionTable stores, for every position, how far the body can
+move in each of the four axis directions before hitting an obstacle. Asking
+how far a body can walk or a bullet can fly is then a table lookup instead of
+a pass over every wall.
+
+The tables only know about the obstacles they were built from. Anything that
+moves (e.g. other bots) still has to go through g.predict_collision().
+"""
+
+# Global imports
+from array import array
+
+# Local imports
+import utils.geometry as g
+from utils.lrucache import LRUCache
+
+# Number of CollisionTables kept around. Obstacles that change give a new
+# table, so the ones of layouts no longer played are let go
+TABLE_CACHE_SIZE = 16
+
+# Cache of the CollisionTables built most recently, keyed by (obstacles, body
+# size)
+_tables = LRUCache(TABLE_CACHE_SIZE)
+
+# Marks table entries where no obstacle lies ahead
+_FREE = -1
+
+"""
+Retrieves the CollisionTable for a set of obstacles and body size, building
+it on first use (or again, if it hasn't been used for a while)
+IN:  - list of pygame.Rect representing the obstacles
+     - 2-tuple representing the body size in (width, height)
+OUT: - the shared CollisionTable
+"""
+def get_collision_table(obstacles, size):
+    key = (tuple(tuple(o) for o in obstacles), tuple(size))
+    table = _tables.get(key)
+    if table is None:
+        table = CollisionTable(obstacles, size)
+        _tables.put(key, table)
+    return table
+
+"""
+Fills a line of one table given the blocked intervals along it
+IN:  - array to fill
+     - index in the array of the first position on the line
+     - number of positions on the line
+     - sorted, merged list of (first, last) blocked positions on the line
+     - bool, True to measure distances towards increasing coordinates
+"""
+def _fill_line(table, base, length, blocked, forward):
+    prev_end = 0
+    runs = []
+    for first, last in blocked:
+        runs.append((prev_end, first))
+        prev_end = last + 1
+    runs.append((prev_end, length))
+    for i, (a, b) in enumerate(runs):
+        if a >= b:
+            continue
+        if forward:
+            # Distance is how far until the blocked position at b
+            if b < length:
+                values = array("i", xrange(b - a - 1, -1, -1))
+            else:
+                values = array("i", [_FREE]) * (b - a)
+        else:
+            # Distance is how far back until the blocked position at a-1
+            if i > 0:
+                values = array("i", xrange(0, b - a))
+            else:
+                values = array("i", [_FREE]) * (b - a)
+        table[base+a:base+b] = values
+
+"""
+Merges overlapping or touching intervals
+IN:  - list of (first, last) inclusive intervals
+OUT: - sorted list of disjoint (first, last) intervals
+"""
+def _merge(intervals):
+    merged = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+class CollisionTable(object):
+
+    """
+    Builds the four directional distance tables. A body at (x, y) overlaps an
+    obstacle iff x lies in [left - width + 1, right - 1] and y lies in
+    [top - height + 1, bottom - 1]. Along each row (or column) of positions
+    these blocked intervals split the line into free runs, and every position
+    in a run is the same distance from the blocked position that ends it.
+    IN:  - list of pygame.Rect representing the obstacles
+         - 2-tuple representing the body size in (width, height)
+    """
+    def __init__(self, obstacles, size):
+        self.obstacles = list(obstacles)
+        self.size = tuple(size)
+        self.right = self.left = self.up = self.down = None
+
+        # Degenerate obstacles are handled specially by predict_collision(),
+        # so leave those maps to it
+        w, h = self.size
+        if (not self.obstacles or w <= 0 or h <= 0 or
+            any(o.width <= 0 or o.height <= 0 for o in self.obstacles)):
+            return
+
+        # The tables span the blocked positions plus one free position on
+        # each side. Lookups outside of them are extrapolated, see predict()
+        blocks = [(o.left - w + 1, o.right - 1, o.top - h + 1, o.bottom - 1)
+                  for o in self.obstacles]
+        self.x0 = min(b[0] for b in blocks) - 1
+        self.y0 = min(b[2] for b in blocks) - 1
+        self.nx = max(b[1] for b in blocks) + 2 - self.x0
+        self.ny = max(b[3] for b in blocks) + 2 - self.y0
+
+        # Horizontal tables are stored row by row, vertical ones column by
+        # column, so that every line is a contiguous slice
+        cells = self.nx * self.ny
+        self.right = array("i", [0]) * cells
+        self.left = array("i", [0]) * cells
+        self.down = array("i", [0]) * cells
+        self.up = array("i", [0]) * cells
+        for y in xrange(self.ny):
+            row = y + self.y0
+            blocked = _merge([(b[0] - self.x0, b[1] - self.x0) for b in blocks
+                              if b[2] <= row <= b[3]])
+            _fill_line(self.right, y*self.nx, self.nx, blocked, True)
+            _fill_line(self.left, y*self.nx, self.nx, blocked, False)
+        for x in xrange(self.nx):
+            col = x + self.x0
+            blocked = _merge([(b[2] - self.y0, b[3] - self.y0) for b in blocks
+                              if b[0] <= col <= b[1]])
+            _fill_line(self.down, x*self.ny, self.ny, blocked, True)
+            _fill_line(self.up, x*self.ny, self.ny, blocked, False)
+
+    """
+    Drop-in replacement for g.predict_collision() against the obstacles the
+    table was built from
+    IN:  - a pygame.Rect representing the object
+         - a number representing velocity in the x coordinate
+         - a number representing velocity in the y coordinate
+    OUT: - an int representing the max distance the object can travel before
+           colliding, or a positive infinity float meaning no collision
+    """
+    def predict(self, body, vx, vy):
+
+        # Fall back to the slow path for bodies the table wasn't built for
+        if self.right is None or (body.width, body.height) != self.size:
+            return g.predict_collision(body, self.obstacles, vx, vy)
+
+        x = body.left - self.x0
+        y = body.top - self.y0
+
+        # Moving horizontally, along a row
+        if vx:
+            if y < 0 or y >= self.ny:
+                return g.POSINF
+            if vx > 0:
+                table, forward = self.right, True
+            else:
+                table, forward = self.left, False
+            line, pos, length = y*self.nx, x, self.nx
+
+        # Moving vertically, along a column
+        elif vy:
+            if x < 0 or x >= self.nx:
+                return g.POSINF
+            if vy > 0:
+                table, forward = self.down, True
+            else:
+                table, forward = self.up, False
+            line, pos, length = x*self.ny, y, self.ny
+
+        # Not moving at all
+        else:
+            return 0
+
+        # Positions beyond the ends of the line are free, and so is every
+        # position between them and the line
+        if pos < 0:
+            if not forward:
+                return g.POSINF
+            extra, pos = -pos, 0
+        elif pos >= length:
+            if forward:
+                return g.POSINF
+            extra, pos = pos - length + 1, length - 1
+        else:
+            extra = 0
+
+        dist = table[line + pos]
+        if dist == _FREE:
+            return g.POSINF
+        return dist + extra
@@ -106,7 +106,8 @@ def collide_rect_circle(rect, circle):
 Given an object, a list of obstacles, and the velocity of the object, determines
 how far the object can move before hitting any of the obstacles. Note that the
 result is only valid for movement along one of the coordinate axes, i.e.
-exactly one of vx or vy must be zero.
+exactly one of vx or vy must be zero. For obstacles that never move,
+utils/collisiontable.py answers the same question with a table lookup.
 IN:  - a pygame.Rect representing the object
      - a list of pygame.Rect representing the obstacles
      - a number representing velocity in the x coordinate
@@ -149,17 +150,17 @@ def predict_collision(body, obstacles, vx, vy):
     # object can travel is the difference between the obstacle's left wall and
     # the object's right wall.
     limit = NEGINF if config[0] == "max" else POSINF
+    b_perp_tl = getattr(body, config[3])
+    b_perp_br = getattr(body, config[4])
+    b_para_f = getattr(body, config[1])
     for o in obstacles:
         ### Perpendicular check
-        b_perp_tl = getattr(body, config[3])
-        b_perp_br = getattr(body, config[4])
         o_perp_tl = getattr(o, config[3])
         o_perp_br = getattr(o, config[4])
         if (b_perp_tl >= o_perp_tl and b_perp_tl < o_perp_br or
             b_perp_br > o_perp_tl and b_perp_br <= o_perp_br or
             b_perp_tl < o_perp_tl and b_perp_br > o_perp_tl):
             ### Parallel check
-            b_para_f = getattr(body, config[1])
             o_para_b = getattr(o, config[2])
             if config[0] == "max" and b_para_f >= o_para_b:
                 limit = max(limit, o_para_b)
@@ -0,0 +1,64 @@
+"""
+interrupts.py
+
+Guards state shared between bots (caches, maps, statistics) against the
+interrupt the Dispatcher uses to stop a virtualbot that runs over its budget.
+That interrupt is an exception raised by a signal handler, so it can land at
+any point of the virtualbot's code, including halfway through updating a cache
+every bot reads from. Code changing such state does so inside a critical
+section:
+
+    with critical:
+        ...
+
+An interrupt landing inside one is held back, and raised once the outermost
+critical section of the thread ends.
+"""
+
+# Global imports
+import threading
+
+class CriticalSection(object):
+
+    """
+    Critical sections can be nested, so every thread keeps count of how deep
+    it is, and of the exception held back, if any
+    """
+    def __init__(self):
+        self.local = threading.local()
+
+    def __enter__(self):
+        self.local.depth = getattr(self.local, "depth", 0) + 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        local = self.local
+        local.depth -= 1
+        if local.depth == 0:
+            pending = getattr(local, "pending", None)
+            if pending is not None:
+                local.pending = None
+                # An exception already on its way out takes its place
+                if exc_type is None:
+                    raise pending
+        return False
+
+    """
+    Raises an exception now, or once the thread's critical sections end if it
+    is inside one
+    IN:  - the exception to raise
+    """
+    def raise_when_safe(self, exception):
+        if getattr(self.local, "depth", 0) > 0:
+            self.local.pending = exception
+        else:
+            raise exception
+
+    """
+    Forgets an exception held back, for when whatever it was meant to stop has
+    ended anyway
+    """
+    def discard_pending(self):
+        self.local.pending = None
+
+# The critical section every piece of shared state uses
+critical = CriticalSection()
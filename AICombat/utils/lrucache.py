@@ -0,0 +1,82 @@
+"""
+lrucache.py
+
+A bounded dictionary that forgets its least recently used entries once full,
+and keeps count of how often lookups find what they're after. Safe to use from
+several threads at once (e.g. virtualbots deciding on the Dispatcher's pool),
+and from virtualbots that may be interrupted for running over budget.
+"""
+
+# Global imports
+import threading
+from collections import OrderedDict
+
+# Local imports
+from utils.interrupts import critical
+
+class LRUCache(object):
+
+    """
+    IN:  - int, max number of entries to keep
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    """
+    Looks up an entry, marking it as the most recently used
+    IN:  - the key to look up
+         - value to return if the key isn't cached
+    OUT: - the cached value, or the default
+    """
+    def get(self, key, default=None):
+        with critical, self.lock:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries[key] = value
+            self.hits += 1
+            return value
+
+    """
+    Stores an entry as the most recently used, evicting the least recently
+    used one if the cache is full
+    IN:  - the key to store under
+         - the value to store
+    """
+    def put(self, key, value):
+        with critical, self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    """
+    Forgets every entry. The statistics are kept
+    """
+    def clear(self):
+        with critical, self.lock:
+            self.entries.clear()
+
+    """
+    OUT: - dict with the number of entries, hits, misses and evictions, and
+           the fraction of lookups that were hits
+    """
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self.entries),
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "hit_rate": float(self.hits) / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
@@ -7,25 +7,126 @@ Contains utility resource loading functions
 
 import pygame
 
+# Decoded images, keyed by (path, colorkey). Each value is a tuple of the
+# surface and whether it has been converted to the display format
+_images = {}
+
+# Rotated copies of images, keyed by (image key, angle). Rotations of a loaded
+# image go by its key in _images (see image_key()), and are dropped along with
+# it
+_rotations = {}
+
 """
-Loads an image
+IN:  - string representing path to image
+     - optional pygame.Color specifying the colorkey, as in load_image()
+OUT: - hashable key the image is cached under, to pass on to rotate_image()
+"""
+def image_key(name, colorkey=None):
+    return (name, _colorkey_key(colorkey))
+
+"""
+Loads an image. Every image is only read from disk once per process; later
+calls with the same path and colorkey return the same surface.
 IN:  - string representing path to image
      - optional pygame.Color specifying the colorkey for the image, which
        determines what color should be transparent
-OUT: - pygame.Surface of the image
+OUT: - pygame.Surface of the image, shared with everyone else who loaded it,
+       so it must not be drawn on
      - pygame.Rect of the image
 """
 def load_image(name, colorkey=None):
+    key = image_key(name, colorkey)
+    image, converted = _images.get(key, (None, False))
+    # Converting needs a display to convert to, which headless runs lack.
+    # An image loaded before the display was set up is converted later
+    can_convert = pygame.display.get_surface() is not None
+    if image is None or can_convert and not converted:
+        image = _read_image(name, colorkey, can_convert)
+        if key in _images:
+            _drop_rotations([key])
+        _images[key] = (image, can_convert)
+    return image, image.get_rect()
+
+"""
+Loads images ahead of time so that the first load_image() call for them
+doesn't touch the disk
+IN:  - list of strings representing paths to images
+     - optional pygame.Color specifying the colorkey, as in load_image()
+"""
+def preload_images(names, colorkey=None):
+    for name in names:
+        load_image(name, colorkey)
+
+"""
+Forgets cached images, along with their rotations
+IN:  - optional string representing path to image, or None to forget every
+       image
+"""
+def evict_images(name=None):
+    if name is None:
+        _images.clear()
+        _rotations.clear()
+        return
+    keys = [key for key in _images if key[0] == name]
+    for key in keys:
+        del _images[key]
+    _drop_rotations(keys)
+
+"""
+Forgets the rotations of images
+IN:  - list of image keys, see image_key()
+"""
+def _drop_rotations(keys):
+    for key in _rotations.keys():
+        if key[0] in keys:
+            del _rotations[key]
+
+"""
+Reads an image from disk and prepares it for drawing
+"""
+def _read_image(name, colorkey, convert):
     try:
         image = pygame.image.load(name)
     except pygame.error as message:
         raise SystemExit(message)
-    image = image.convert_alpha()
+    if convert:
+        image = image.convert_alpha()
     if colorkey is not None:
         if colorkey is -1:
             colorkey = image.get_at((0, 0))
         image.set_colorkey(colorkey, pygame.RLEACCEL)
-    return image, image.get_rect()
+    return image
+
+"""
+Turns a colorkey into something usable as a dict key
+"""
+def _colorkey_key(colorkey):
+    if colorkey is None or colorkey is -1:
+        return colorkey
+    return tuple(colorkey)
+
+"""
+Rotates an image, keeping the result so that every later rotation of the same
+image by the same angle is a dictionary lookup. Angles are whole degrees, so
+at most 360 copies of each image are ever kept.
+IN:  - pygame.Surface to rotate
+     - int, angle in degrees counterclockwise
+     - optional hashable key identifying the image, i.e. the image_key() it
+       was loaded with, so that separately loaded copies share rotations and
+       the rotations go when load_image() replaces the image. Defaults to the
+       surface itself
+OUT: - rotated pygame.Surface, shared with everyone else who asks for it, so
+       it must not be drawn on
+"""
+def rotate_image(image, angle, key=None):
+    if key is None:
+        key = image
+    angle = int(angle) % 360
+    rotated = _rotations.get((key, angle))
+    if rotated is None:
+        rotated = pygame.transform.rotate(image, angle)
+        _rotations[(key, angle)] = rotated
+    return rotated
 
 """
 Loads a sound file
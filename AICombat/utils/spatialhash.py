@@ -0,0 +1,111 @@
+"""
+spatialhash.py
+
+A uniform grid that buckets rectangles by the cells they overlap. Looking up
+what might collide with a rect then only needs to check the few cells the
+rect covers, instead of every object in the arena.
+"""
+
+class SpatialHash(object):
+
+    """
+    IN:  - int, width and height of a grid cell in pixels
+    """
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.count = 0
+
+    """
+    Removes everything from the grid. The buckets are emptied rather than
+    thrown away, since the next round of inserts mostly fills the same cells
+    """
+    def clear(self):
+        for bucket in self.cells.itervalues():
+            del bucket[:]
+        self.count = 0
+
+    """
+    Adds an item to every cell its rect overlaps
+    IN:  - the item to store
+         - pygame.Rect representing the item's position
+    """
+    def insert(self, item, rect):
+        entry = (self.count, item, rect)
+        self.count += 1
+        for cell in self._cells_of(rect.left, rect.top, rect.width,
+                                   rect.height):
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                self.cells[cell] = [entry]
+            else:
+                bucket.append(entry)
+
+    """
+    Finds the items that share a cell with the given rect. Every item whose
+    rect overlaps the given rect is included, but so may be a few that don't.
+    IN:  - pygame.Rect to look around
+    OUT: - list of items, in the order they were inserted
+    """
+    def query(self, rect):
+        found = {}
+        for cell in self._cells_of(rect.left, rect.top, rect.width,
+                                   rect.height):
+            bucket = self.cells.get(cell)
+            if bucket:
+                for order, item, item_rect in bucket:
+                    found[order] = item
+        return [found[order] for order in sorted(found)]
+
+    """
+    Finds the first item (in the order they were inserted) whose rect overlaps
+    an area. This is for callers that test many small areas, such as bullets,
+    so the area is given as plain numbers and nothing is allocated
+    IN:  - left, top, width and height of the area in pixels
+         - optional item to leave out
+    OUT: - the item, or None if no rect overlaps the area
+    """
+    def find_first(self, left, top, width, height, exclude=None):
+        size = self.cell_size
+        right = left + width
+        bottom = top + height
+        first_col = left // size
+        first_row = top // size
+        last_col = (right - 1) // size
+        last_row = (bottom - 1) // size
+
+        # Within one cell, the first overlapping entry of its bucket is it
+        if first_col == last_col and first_row == last_row:
+            for order, item, rect in self.cells.get((first_col, first_row),
+                                                    ()):
+                if (item is not exclude and
+                    left < rect.right and rect.left < right and
+                    top < rect.bottom and rect.top < bottom):
+                    return item
+            return None
+
+        # Otherwise the earliest of every bucket's first
+        found = None
+        found_order = None
+        for col in xrange(first_col, last_col + 1):
+            for row in xrange(first_row, last_row + 1):
+                for order, item, rect in self.cells.get((col, row), ()):
+                    if found is not None and order >= found_order:
+                        break
+                    if (item is not exclude and
+                        left < rect.right and rect.left < right and
+                        top < rect.bottom and rect.top < bottom):
+                        found, found_order = item, order
+                        break
+        return found
+
+    """
+    Generates the (column, row) of every cell an area overlaps
+    """
+    def _cells_of(self, left, top, width, height):
+        size = self.cell_size
+        right = (left + max(width, 1) - 1) // size
+        bottom = (top + max(height, 1) - 1) // size
+        for col in xrange(left // size, right + 1):
+            for row in xrange(top // size, bottom + 1):
+                yield (col, row)
@@ -2,5 +2,6 @@ from dumbbot import Dumbbot
 from navbot import Navbot
 from stalkerbot import Stalkerbot
 from playerbot import Playerbot
+from remotebot import Remote
 
-__all__ = ["Dumbbot", "Navbot", "Stalkerbot", "Playerbot"]
+__all__ = ["Dumbbot", "Navbot", "Stalkerbot", "Playerbot", "Remote"]
@@ -0,0 +1,297 @@
+"""
+astar.py
+
+The A* search behind Navbot.navigate(). The search walks a simple waypoint
+grid: from any point it steps 10 pixels in each of the four directions, except
+that steps crossing one of the destination's axes stop on that axis, so that
+the destination itself can be reached. Walking costs d.duration.WALK per pixel
+and every 90 degree turn costs d.duration.TURN.
+
+Rather than one object per waypoint, the search keeps its state in flat arrays
+indexed like NavMap.reachable (x*height + y), and its open list is a heap of
+plain ints. Each int packs the ordering of a waypoint, (priority, heuristic,
+x, y), so the heap compares ints instead of calling a Python __lt__, in the
+same order the old Waypoint objects compared. The arrays are allocated once
+per thread and map size, and are never cleared: a waypoint only counts as seen
+if it was stamped during the current search.
+
+The paths found are those of the old Waypoint search, except where the
+destination lines up with the start's grid: a whole number of steps away
+across or down, e.g. when it shares a row or column with the start. Stepping
+left or up off one of the destination's axes then moved 0 pixels in the old
+search, so waypoints on those axes could only be left rightwards or
+downwards. Those steps now move a whole step, which gives shorter paths, and
+finds some the old search missed.
+
+A search can also be run a slice at a time (see Search.step), for bots that
+can't afford a whole search in one decision. Such a search needs arrays of its
+own while it waits between slices; those are handed out from a small pool per
+map size, and handed back once the search ends.
+"""
+
+# Global imports
+import heapq
+import threading
+import time
+from array import array
+
+# Local imports
+import real.definitions as d
+from utils.interrupts import critical
+
+# Search arrays of each thread, keyed by map size
+_local = threading.local()
+
+# Most unused search arrays kept per map size for searches run a slice at a
+# time
+POOL_SIZE = 2
+
+# Unused search arrays for searches run a slice at a time, keyed by number of
+# positions on the map
+_pool = {}
+_pool_lock = threading.Lock()
+
+class Scratch(object):
+
+    __slots__ = ("stamp", "generation", "parent", "direction")
+
+    """
+    Search arrays for maps of one size. Only one search at a time may use
+    them, so a search that is put on hold between slices needs its own.
+    IN:  - number of positions on the map
+    """
+    def __init__(self, cells):
+        self.stamp = array("i", [0]) * cells
+        self.generation = 0
+        self.parent = array("i", [0]) * cells
+        self.direction = bytearray(cells)
+
+    """
+    Starts a new generation of stamps, forgetting everything seen so far
+    OUT: - int, the new generation
+    """
+    def renew(self):
+        self.generation += 1
+        if self.generation >= 2**31 - 1:
+            self.stamp = array("i", [0]) * len(self.stamp)
+            self.generation = 1
+        return self.generation
+
+"""
+Retrieves this thread's search arrays for a map size, allocating them on first
+use
+"""
+def _get_scratch(width, height):
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    scratch = buffers.get((width, height))
+    if scratch is None:
+        scratch = buffers[(width, height)] = Scratch(width * height)
+    return scratch
+
+"""
+Takes search arrays for a search run a slice at a time from the pool,
+allocating them if there are none to spare
+IN:  - number of positions on the map
+OUT: - Scratch to hand back to release_scratch() once the search ends
+"""
+def acquire_scratch(cells):
+    with critical, _pool_lock:
+        free = _pool.get(cells)
+        if free:
+            return free.pop()
+    return Scratch(cells)
+
+"""
+Hands search arrays back to the pool, which keeps up to POOL_SIZE of them
+IN:  - Scratch from acquire_scratch() that no search uses any more
+"""
+def release_scratch(scratch):
+    with critical, _pool_lock:
+        free = _pool.setdefault(len(scratch.stamp), [])
+        if len(free) < POOL_SIZE:
+            free.append(scratch)
+
+"""
+Finds a path on the waypoint grid, in one go
+IN:  - NavMap to search
+     - tuple indicating start point
+     - tuple indicating destination point
+     - direction the bot starts out facing
+OUT: - list containing points to follow to get to destination, or an empty
+       list if the destination can't be reached
+"""
+def find_path(navmap, start, dest, direction):
+    search = Search(navmap, start, dest, direction)
+    search.step()
+    return search.get_path()
+
+class Search(object):
+
+    """
+    Sets up a search. Nothing is searched until step() is called.
+    IN:  - NavMap to search
+         - tuple indicating start point
+         - tuple indicating destination point
+         - direction the bot starts out facing
+         - Scratch for the map size to keep the search in, or None to use
+           this thread's. Searches run a slice at a time must not share one
+    """
+    def __init__(self, navmap, start, dest, direction, scratch=None):
+        self.navmap = navmap
+        self.start = start
+        self.dest = dest
+        self.direction = direction
+        if scratch is None:
+            scratch = _get_scratch(navmap.width, navmap.height)
+        self.scratch = scratch
+        self.generation = scratch.renew()
+        self.done = False
+        self.found = False
+        self.expansions = 0
+        self.seconds = 0.0
+
+        # Heap entries are ((priority*span + heuristic)*cells + index). Every
+        # heuristic is below span and every index below cells, so comparing the
+        # ints compares (priority, heuristic, x, y)
+        walk = d.duration.WALK
+        self.cells = navmap.width * navmap.height
+        self.span = (navmap.width + navmap.height) * walk + 1
+
+        index = start[0]*navmap.height + start[1]
+        scratch.stamp[index] = self.generation
+        scratch.parent[index] = -1
+        scratch.direction[index] = direction
+        h = (abs(start[0] - dest[0]) + abs(start[1] - dest[1])) * walk
+        self.targets = [(h*self.span + h)*self.cells + index]
+
+    """
+    Runs the search until it ends, or for a number of waypoint expansions
+    IN:  - max number of waypoints to expand, or None for no limit
+    OUT: - bool indicating whether the search has ended
+    """
+    def step(self, budget=None):
+        if self.done:
+            return True
+        began = time.time()
+        navmap = self.navmap
+        width = navmap.width
+        height = navmap.height
+        cells = self.cells
+        span = self.span
+        reachable = navmap.reachable
+        walk = d.duration.WALK
+        turn = d.duration.TURN
+        dest_x, dest_y = self.dest
+        dest_index = dest_x*height + dest_y
+        stamp = self.scratch.stamp
+        generation = self.generation
+        parent = self.scratch.parent
+        facing = self.scratch.direction
+        targets = self.targets
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+
+        # These difference offsets are used to place intermediate waypoints on
+        # the axes of the destination
+        x_diff = (dest_x - self.start[0]) % 10
+        y_diff = (dest_y - self.start[1]) % 10
+
+        expansions = 0
+        while targets:
+            if budget is not None and expansions >= budget:
+                break
+
+            # Look for the waypoint closest to destination
+            key = heappop(targets)
+            expansions += 1
+            index = key % cells
+            if index == dest_index:
+                self.found = True
+                break
+            rest = key // cells
+            distance = rest // span - rest % span
+            x = index // height
+            y = index % height
+            cur_dir = facing[index]
+
+            for i in xrange(4):
+                # Determine how to move. Steps crossing the destination's axes
+                # stop on them, and steps off them go back onto the grid
+                # (a whole step if the axis is on the grid)
+                if i == 0:
+                    x_off, y_off = 10, 0
+                    if x == dest_x:
+                        x_off = 10 - x_diff
+                    elif x < dest_x < x + 10:
+                        x_off = x_diff
+                elif i == 1:
+                    x_off, y_off = 0, -10
+                    if y == dest_y:
+                        y_off = -y_diff or -10
+                    elif y - 10 < dest_y < y:
+                        y_off = y_diff - 10
+                elif i == 2:
+                    x_off, y_off = -10, 0
+                    if x == dest_x:
+                        x_off = -x_diff or -10
+                    elif x - 10 < dest_x < x:
+                        x_off = x_diff - 10
+                else:
+                    x_off, y_off = 0, 10
+                    if y == dest_y:
+                        y_off = 10 - y_diff
+                    elif y < dest_y < y + 10:
+                        y_off = y_diff
+                next_x = x + x_off
+                next_y = y + y_off
+
+                # Make sure next location is legal, reachable, and unseen
+                if (next_x < 0 or next_x >= width or
+                    next_y < 0 or next_y >= height):
+                    continue
+                next_index = next_x*height + next_y
+                if not reachable[next_index] or stamp[next_index] == generation:
+                    continue
+
+                # Compute cost to get there
+                cost = distance + (abs(x_off) + abs(y_off)) * walk
+                diff_dir = (cur_dir - i) % 4
+                if diff_dir == 1 or diff_dir == 3:
+                    cost += turn
+                elif diff_dir == 2:
+                    cost += turn * 2
+
+                # Save as candidate location to visit
+                stamp[next_index] = generation
+                parent[next_index] = index
+                facing[next_index] = i
+                h = (abs(next_x - dest_x) + abs(next_y - dest_y)) * walk
+                heappush(targets, ((cost + h)*span + h)*cells + next_index)
+
+        self.expansions += expansions
+        self.seconds += time.time() - began
+        if self.found or not targets:
+            self.done = True
+            navmap.record_search(self.expansions, self.seconds)
+        return self.done
+
+    """
+    OUT: - list containing points to follow to get to destination, or an empty
+           list if the destination can't be reached or the search hasn't ended
+    """
+    def get_path(self):
+        if not self.found:
+            return []
+
+        # Retrieve path of waypoints
+        height = self.navmap.height
+        parent = self.scratch.parent
+        path = []
+        index = self.dest[0]*height + self.dest[1]
+        while index != -1:
+            path.append((index // height, index % height))
+            index = parent[index]
+        path.reverse()
+        return path
@@ -4,9 +4,6 @@ dumbbot.py
 An extremely dumb virtual bot used for testing purposes. Does random things.
 """
 
-# Global imports
-import random
-
 # Local imports
 import real.definitions as d
 from virtual.virtualbot import Virtualbot
@@ -21,12 +18,12 @@ class Dumbbot(Virtualbot):
 
         decision = {}
 
-        roll = random.randint(0, 99)
+        roll = self.random.randint(0, 99)
         if roll < 30:
             decision['action'] = d.action.CONTINUE
         elif roll < 80:
             decision['action'] = d.action.WALK
-            decision['distance'] = random.randint(1,10)
+            decision['distance'] = self.random.randint(1,10)
         elif roll < 95:
             decision['action'] = d.action.TURN
             decision['direction'] = d.direction.RIGHT
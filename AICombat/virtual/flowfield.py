@@ -0,0 +1,207 @@
+"""
+flowfield.py
+
+Flow fields for bots heading to the same place. Instead of every bot searching
+its own way to a goal, a flow field is computed once from the goal outwards: it
+holds how many waypoint steps away from the goal every waypoint is. Any bot can
+then find its way by stepping, from wherever it is, to a neighbouring waypoint
+one step closer, which takes O(1) per step. Chasing a bot then costs one field
+per target rather than one search per chaser.
+
+Like A* (see astar.py), a field walks a grid of waypoints WAYPOINT_STEP pixels
+apart, and only checks the waypoints it lands on. The grid is lined up with
+the goal so that the goal itself is a waypoint.
+
+Fields are shared through the NavMap, which caches them per goal cell: the
+square of WAYPOINT_STEP pixels the goal lies in. Every goal in the cell is
+served by the same field, whichever bot asked first, so a goal that moves a
+little doesn't cost a new field until it leaves its cell.
+"""
+
+# Global imports
+from array import array
+from collections import deque
+
+# Local imports
+import real.definitions as d
+from virtual.navmap import WAYPOINT_STEP
+
+"""
+Retrieves the flow field towards a goal, computing it on first use
+IN:  - NavMap to find the way on
+     - tuple of (x, y) specifying the goal
+OUT: - the shared FlowField, or None if there is no reachable position in the
+       goal's cell
+"""
+def get_flow_field(navmap, goal):
+    cell = (goal[0] // WAYPOINT_STEP, goal[1] // WAYPOINT_STEP)
+    field = navmap.fields.get(cell)
+    if field is None:
+
+        # Every goal in the cell gets the field of the same anchor, the first
+        # reachable position of the cell, so that which goal in the cell was
+        # asked for first doesn't matter
+        anchor = None
+        top = cell[1] * WAYPOINT_STEP
+        bottom = min(top + WAYPOINT_STEP, navmap.height)
+        for x in xrange(cell[0] * WAYPOINT_STEP,
+                        min((cell[0] + 1) * WAYPOINT_STEP, navmap.width)):
+            y = navmap.reachable.find(b"\x01", x*navmap.height + top,
+                                      x*navmap.height + bottom)
+            if y != -1:
+                anchor = (x, y - x*navmap.height)
+                break
+        if anchor is None:
+            return None
+        field = FlowField(navmap, anchor)
+        navmap.fields.put(cell, field)
+    return field
+
+class FlowField(object):
+
+    """
+    Computes the distance to the anchor from every waypoint, with a breadth
+    first search (every step costs the same, so this is Dijkstra's algorithm
+    without the heap). The distances are kept in a flat array with one entry
+    per waypoint, -1 where the anchor can't be reached.
+    IN:  - NavMap to find the way on
+         - tuple of (x, y) specifying the reachable position to head to
+    """
+    def __init__(self, navmap, anchor):
+        self.navmap = navmap
+        self.anchor = anchor
+        self.x0 = anchor[0] % WAYPOINT_STEP
+        self.y0 = anchor[1] % WAYPOINT_STEP
+        self.columns = -(-(navmap.width - self.x0) // WAYPOINT_STEP)
+        self.rows = -(-(navmap.height - self.y0) // WAYPOINT_STEP)
+        self.distance = array("i", [-1]) * (self.columns * self.rows)
+
+        # Waypoint (i, j) is at (x0 + i*WAYPOINT_STEP, y0 + j*WAYPOINT_STEP),
+        # and sits at index i*rows + j of distance. Its neighbours are rows
+        # or 1 entries away in distance, and a column or row of WAYPOINT_STEP
+        # pixels away in reachable
+        columns, rows = self.columns, self.rows
+        reachable = navmap.reachable
+        distance = self.distance
+        across = WAYPOINT_STEP * navmap.height
+        down = WAYPOINT_STEP
+        i = anchor[0] // WAYPOINT_STEP
+        j = anchor[1] // WAYPOINT_STEP
+        distance[i*rows + j] = 0
+        frontier = deque([(i, j, anchor[0]*navmap.height + anchor[1])])
+        while frontier:
+            i, j, pixel = frontier.popleft()
+            node = i*rows + j
+            steps = distance[node] + 1
+            if (i + 1 < columns and distance[node + rows] == -1 and
+                reachable[pixel + across]):
+                distance[node + rows] = steps
+                frontier.append((i + 1, j, pixel + across))
+            if (j > 0 and distance[node - 1] == -1 and
+                reachable[pixel - down]):
+                distance[node - 1] = steps
+                frontier.append((i, j - 1, pixel - down))
+            if (i > 0 and distance[node - rows] == -1 and
+                reachable[pixel - across]):
+                distance[node - rows] = steps
+                frontier.append((i - 1, j, pixel - across))
+            if (j + 1 < rows and distance[node + 1] == -1 and
+                reachable[pixel + down]):
+                distance[node + 1] = steps
+                frontier.append((i, j + 1, pixel + down))
+
+    """
+    IN:  - tuple of (x, y), which must be a waypoint of this field
+    OUT: - int, number of steps from there to the anchor, or -1 if it can't be
+           reached
+    """
+    def get_distance(self, loc):
+        return self.distance[(loc[0] // WAYPOINT_STEP) * self.rows +
+                             loc[1] // WAYPOINT_STEP]
+
+    """
+    Finds the next waypoint on the way to the anchor. Of the neighbours one
+    step closer, the one straight ahead is preferred, then the ones needing a
+    single turn, so that bots don't zigzag.
+    IN:  - tuple of (x, y), which must be a waypoint of this field
+         - direction the bot is facing
+    OUT: - tuple of (x, y) of the next waypoint, or None if loc is the anchor
+           or the anchor can't be reached from loc
+    """
+    def get_next(self, loc, direction):
+        steps = self.get_distance(loc)
+        if steps <= 0:
+            return None
+        best = None
+        for step_dir in xrange(4):
+            x = loc[0] + d.DX[step_dir]*WAYPOINT_STEP
+            y = loc[1] + d.DY[step_dir]*WAYPOINT_STEP
+            if (x < 0 or x >= self.navmap.width or
+                y < 0 or y >= self.navmap.height):
+                continue
+            if self.get_distance((x, y)) != steps - 1:
+                continue
+            turns = (direction - step_dir) % 4
+            turns = min(turns, 4 - turns)
+            if best is None or turns < best[0]:
+                best = (turns, (x, y))
+        return best[1]
+
+    """
+    Finds the way from any position to a goal in the anchor's cell. The way
+    first moves onto a nearby waypoint, in at most two straight stretches
+    shorter than WAYPOINT_STEP, then follows the field to the anchor, and
+    finally moves on to the goal in the same way if it isn't the anchor.
+    IN:  - tuple of (x, y) to start from
+         - direction the bot starts out facing
+         - tuple of (x, y) of the goal
+    OUT: - tuple of points from start to goal, or None if the field doesn't
+           lead there
+    """
+    def get_path(self, start, direction, goal):
+        navmap = self.navmap
+
+        # Of the waypoints around start, get on the one closest to the anchor
+        best = None
+        for x, y in navmap.get_waypoints_around(start, self.anchor):
+            steps = self.get_distance((x, y))
+            if steps == -1:
+                continue
+            way = navmap.get_detour(start, (x, y))
+            if way is None:
+                continue
+            length = steps*WAYPOINT_STEP + abs(x - start[0]) + abs(y - start[1])
+            if best is None or length < best[0]:
+                best = (length, way)
+        if best is None:
+            return None
+        path = [start] + best[1]
+
+        # Follow the field
+        loc = path[-1]
+        if len(path) > 1:
+            direction = self._direction(path[-2], loc)
+        while True:
+            next_loc = self.get_next(loc, direction)
+            if next_loc is None:
+                break
+            direction = self._direction(loc, next_loc)
+            path.append(next_loc)
+            loc = next_loc
+
+        # Get off at the goal
+        if goal != self.anchor:
+            way = navmap.get_detour(self.anchor, goal)
+            if way is None:
+                return None
+            path.extend(way)
+        return tuple(path)
+
+    """
+    OUT: - direction of the straight stretch from a to b
+    """
+    def _direction(self, a, b):
+        for step_dir in xrange(4):
+            if ((b[0] - a[0]) * d.DX[step_dir] > 0 or
+                (b[1] - a[1]) * d.DY[step_dir] > 0):
+                return step_dir
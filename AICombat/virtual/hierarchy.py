@@ -0,0 +1,287 @@
+"""
+hierarchy.py
+
+Hierarchical path finding (HPA*) for long trips on large maps. A* searches the
+waypoint grid one waypoint at a time, so a trip across a large map expands a
+good share of all its waypoints. Instead, the map is split into square
+clusters of waypoints, and the ways between clusters are summed up as a small
+graph:
+- Entrances are pairs of neighbouring waypoints on either side of the border
+  between two clusters. Each open stretch of a border gets one entrance in its
+  middle, or one at either end if it is long.
+- Within a cluster, every entrance is linked to the others it can reach, by
+  how many steps it takes.
+A long trip is first planned over this graph, which takes a few steps per
+cluster rather than per waypoint, and only the legs of that plan are then
+searched for waypoint by waypoint, each within a cluster or two.
+
+The graph uses a fixed waypoint grid, WAYPOINT_STEP pixels apart starting at
+(0, 0). Trips get on and off it in short straight stretches, like flow fields
+do. Entrances are found when the hierarchy is built, once per NavMap, but the
+links within a cluster are only worked out once a trip passes through it.
+The paths found are close to, though not always as short as, those of A*.
+"""
+
+# Global imports
+import heapq
+from collections import deque
+
+# Local imports
+import real.definitions as d
+from virtual.astar import find_path
+from virtual.navmap import WAYPOINT_STEP
+
+"""
+Retrieves the hierarchy of a map, building it on first use
+IN:  - NavMap to plan on
+OUT: - the shared Hierarchy
+"""
+def get_hierarchy(navmap):
+    if navmap.hierarchy is None:
+        navmap.hierarchy = Hierarchy(navmap)
+    return navmap.hierarchy
+
+class Hierarchy(object):
+
+    # Width and height of a cluster, in waypoints
+    CLUSTER_SIZE = 10
+
+    # Open stretches of border longer than this get two entrances
+    LONG_ENTRANCE = 6
+
+    """
+    Finds the open waypoints of the grid and the entrances between clusters.
+    Waypoint (i, j) of the grid lies at (i*WAYPOINT_STEP, j*WAYPOINT_STEP),
+    and is numbered i*rows + j.
+    IN:  - NavMap to plan on
+    """
+    def __init__(self, navmap):
+        self.navmap = navmap
+        self.columns = -(-navmap.width // WAYPOINT_STEP)
+        self.rows = -(-navmap.height // WAYPOINT_STEP)
+        size = self.CLUSTER_SIZE
+        self.cluster_rows = -(-self.rows // size)
+
+        # Which waypoints are reachable, one byte per waypoint
+        self.open = bytearray(self.columns * self.rows)
+        height = navmap.height
+        for i in xrange(self.columns):
+            x = i * WAYPOINT_STEP
+            self.open[i*self.rows:(i+1)*self.rows] = (
+                navmap.reachable[x*height:(x+1)*height:WAYPOINT_STEP])
+
+        # Entrances of every cluster, and the waypoints across the border
+        # each entrance leads to (two for an entrance in a cluster's corner)
+        self.entrances = {}
+        self.crossings = {}
+        rows = self.rows
+        for border in xrange(size, self.columns, size):
+            self._add_entrances([((border - 1)*rows + j, border*rows + j)
+                                 for j in xrange(rows)])
+        for border in xrange(size, rows, size):
+            self._add_entrances([(i*rows + border - 1, i*rows + border)
+                                 for i in xrange(self.columns)])
+
+        # Links between the entrances of every cluster, once worked out
+        self.links = {}
+
+    """
+    Finds the entrances along one border. Stretches are cut where the border
+    of one cluster ends and the next begins.
+    IN:  - list of (waypoint, waypoint across) pairs along the border, in
+           order
+    """
+    def _add_entrances(self, pairs):
+        stretch = []
+        for a, b in pairs + [(None, None)]:
+            if (a is not None and self.open[a] and self.open[b] and
+                (not stretch or
+                 self._cluster(a) == self._cluster(stretch[-1][0]))):
+                stretch.append((a, b))
+                continue
+            if stretch:
+                if len(stretch) > self.LONG_ENTRANCE:
+                    chosen = (stretch[0], stretch[-1])
+                else:
+                    chosen = (stretch[len(stretch) // 2],)
+                for a_end, b_end in chosen:
+                    for node, across in ((a_end, b_end), (b_end, a_end)):
+                        if node not in self.crossings:
+                            self.crossings[node] = []
+                            self.entrances.setdefault(self._cluster(node),
+                                                      []).append(node)
+                        self.crossings[node].append(across)
+            stretch = []
+            if a is not None and self.open[a] and self.open[b]:
+                stretch.append((a, b))
+
+    """
+    OUT: - int, number of the cluster a waypoint lies in
+    """
+    def _cluster(self, node):
+        i, j = divmod(node, self.rows)
+        return ((i // self.CLUSTER_SIZE) * self.cluster_rows +
+                j // self.CLUSTER_SIZE)
+
+    """
+    Counts the steps from a waypoint to every waypoint of its cluster, without
+    leaving the cluster
+    OUT: - dict mapping waypoints to their number of steps away
+    """
+    def _flood(self, node):
+        rows = self.rows
+        size = self.CLUSTER_SIZE
+        i, j = divmod(node, rows)
+        left = i - i % size
+        right = min(left + size, self.columns)
+        top = j - j % size
+        bottom = min(top + size, rows)
+        steps = {node: 0}
+        frontier = deque([node])
+        while frontier:
+            node = frontier.popleft()
+            i, j = divmod(node, rows)
+            for next_node, inside in ((node + rows, i + 1 < right),
+                                      (node - 1, j > top),
+                                      (node - rows, i > left),
+                                      (node + 1, j + 1 < bottom)):
+                if (inside and self.open[next_node] and
+                    next_node not in steps):
+                    steps[next_node] = steps[node] + 1
+                    frontier.append(next_node)
+        return steps
+
+    """
+    Links every entrance of a cluster to the others, working them out on
+    first use
+    OUT: - dict mapping each entrance to a list of (entrance, steps)
+    """
+    def _get_links(self, cluster):
+        links = self.links.get(cluster)
+        if links is None:
+            links = {}
+            entrances = self.entrances.get(cluster, [])
+            for node in entrances:
+                steps = self._flood(node)
+                links[node] = [(other, steps[other]) for other in entrances
+                               if other != node and other in steps]
+            self.links[cluster] = links
+        return links
+
+    """
+    Finds a path over the cluster graph, then searches every leg of it
+    IN:  - tuple indicating start point
+         - tuple indicating destination point
+         - direction the bot starts out facing
+    OUT: - list containing points to follow to get to destination, or None if
+           no path was found this way (it may still exist, A* can tell)
+    """
+    def find_path(self, start, dest, direction):
+        on = self.navmap.get_on_grid(start, dest)
+        off = self.navmap.get_on_grid(dest, start)
+        if on is None or off is None:
+            return None
+        (x, y), way_on = on
+        source = (x // WAYPOINT_STEP) * self.rows + y // WAYPOINT_STEP
+        (x, y), way_off = off
+        target = (x // WAYPOINT_STEP) * self.rows + y // WAYPOINT_STEP
+        target_cluster = self._cluster(target)
+        if self._cluster(source) == target_cluster:
+            return None
+        plan = self._plan(source, target)
+        if plan is None:
+            return None
+
+        # Get on the grid
+        path = [start] + way_on
+
+        # Search the legs of the plan. Crossing a border is a single step,
+        # anything else stays within a cluster
+        rows = self.rows
+        for a, b in zip(plan, plan[1:]):
+            leg_end = ((b // rows) * WAYPOINT_STEP, (b % rows) * WAYPOINT_STEP)
+            if b in self.crossings.get(a, ()):
+                path.append(leg_end)
+                continue
+            leg = find_path(self.navmap, path[-1], leg_end,
+                            self._heading(path, direction))
+            if not leg:
+                return None
+            path.extend(leg[1:])
+
+        # Get off the grid, the way getting on from dest would have gone
+        if way_off:
+            path.extend(reversed(way_off[:-1]))
+            path.append(dest)
+        return path
+
+    """
+    A* over the cluster graph, with the number of steps as cost
+    IN:  - waypoints to start from and to head for
+    OUT: - list of the waypoints from source to target where the plan enters
+           and leaves clusters, or None if there is no way
+    """
+    def _plan(self, source, target):
+        rows = self.rows
+        target_i, target_j = divmod(target, rows)
+        target_cluster = self._cluster(target)
+
+        # Source and target are linked to the entrances of their own cluster
+        # for this trip only
+        source_steps = self._flood(source)
+        source_links = [(node, source_steps[node]) for node
+                        in self.entrances.get(self._cluster(source), [])
+                        if node in source_steps]
+        target_steps = self._flood(target)
+
+        def heuristic(node):
+            i, j = divmod(node, rows)
+            return abs(i - target_i) + abs(j - target_j)
+
+        best = {source: 0}
+        parent = {source: None}
+        targets = [(heuristic(source), 0, source)]
+        while targets:
+            priority, steps, node = heapq.heappop(targets)
+            if steps > best[node]:
+                continue
+            if node == target:
+                plan = []
+                while node is not None:
+                    plan.append(node)
+                    node = parent[node]
+                plan.reverse()
+                return plan
+
+            cluster = self._cluster(node)
+            if node == source:
+                neighbours = list(source_links)
+            else:
+                neighbours = list(self._get_links(cluster)[node])
+            for across in self.crossings.get(node, ()):
+                neighbours.append((across, 1))
+            if cluster == target_cluster and node in target_steps:
+                neighbours.append((target, target_steps[node]))
+            for next_node, cost in neighbours:
+                next_steps = steps + cost
+                if next_steps < best.get(next_node, next_steps + 1):
+                    best[next_node] = next_steps
+                    parent[next_node] = node
+                    heapq.heappush(targets, (next_steps + heuristic(next_node),
+                                             next_steps, next_node))
+        return None
+
+    """
+    OUT: - direction a bot following the path so far ends up facing
+    """
+    def _heading(self, path, direction):
+        if len(path) < 2:
+            return direction
+        (ax, ay), (bx, by) = path[-2], path[-1]
+        if bx > ax:
+            return d.direction.RIGHT
+        if by < ay:
+            return d.direction.UP
+        if bx < ax:
+            return d.direction.LEFT
+        return d.direction.DOWN
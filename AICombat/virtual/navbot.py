@@ -17,44 +17,46 @@ the status of the queue yourself. Note that if you interrupt a navigation
 action sequence to perform an action, most of the time your navigation sequence
 will be invalidated (for instance, you suddenly decide to turn around, or
 prematurely cancel a long walk), and you must clear the queue and re-navigate.
+
+On large maps a search can take longer than a game tick. A subclass can set
+SEARCH_BUDGET to spread the searches of queue_navigate() and
+queue_renavigate() over several decisions. Until the search ends the bot is
+left standing (is_navigating() tells when that is), and the route found is
+then queued as usual. Subclasses must not ask for a new route every decision
+while one is being searched for, or the search never gets anywhere.
 """
 
 # Global imports
 import copy
-import heapq
 
 # Local imports
 import real.definitions as d
+from virtual.astar import (Search, acquire_scratch, find_path,
+                           release_scratch)
+from virtual.flowfield import get_flow_field
+from virtual.hierarchy import get_hierarchy
+from virtual.navmap import get_navmap
+from virtual.pathdatabase import get_path_database
 from virtual.queuebot import Queuebot
-from utils.comparable import Comparable
 
 class Navbot(Queuebot):
 
-    """
-    A utility Waypoint class that defines nodes in the map for path-finding.
-    These Waypoints support a heuristic and distance for use by A*, a prev
-    variable for tracking path, and a direction marker to account for turn rate.
-    """
-    class Waypoint(Comparable):
+    # Furthest a destination may move from the end of the current route for
+    # renavigate() to repair the route rather than plan a new one, and how
+    # much longer than a straight line the repaired part may be. Repaired
+    # routes can be longer than fresh ones, so these are kept tight: chasing
+    # bots repairing over longer distances end up circling each other
+    REPAIR_RADIUS = 20
+    REPAIR_DETOUR = 10
 
-        def __init__(self, x, y, heuristic, distance, prev, direction):
-            self.x = x
-            self.y = y
-            self.heuristic = heuristic
-            self.distance = distance
-            self.priority = self.heuristic + self.distance
-            self.prev = prev
-            self.direction = direction
+    # Most waypoints the queue methods may search per decision, or None to
+    # always search all the way in one go
+    SEARCH_BUDGET = None
 
-        """
-        Mandatory override of the < operator for Comparable
-        """
-        def __lt__(self, other):
-            if self.priority != other.priority:
-                return self.priority < other.priority
-            if self.heuristic != other.heuristic:
-                return self.heuristic < other.heuristic
-            return (self.x, self.y) < (other.x, other.y)
+    # Trips at least this long (in pixels, walking distance) are planned over
+    # the map's cluster graph (see hierarchy.py) rather than searched for one
+    # waypoint at a time. On the stock arena no trip is that long
+    LONG_TRIP = 800
 
     def __init__(self, arena_data):
 
@@ -64,22 +66,24 @@ class Navbot(Queuebot):
 
         # Navbot stuff
         self.navbot_waypoints = []
-        self.navbot_reachable = []
-
-        # Compute all reachable and unreachable pixels
-        # Won't use _too_ much memory as long as the map isn't too big....
+        ### Points along the route last queued, see renavigate()
+        self.navbot_route = None
+        ### Unfinished search of the queue methods, as (cache key, Search),
+        ### see SEARCH_BUDGET
+        self.navbot_search = None
+
+        # Look up which pixels are reachable and unreachable. The map is
+        # shared by every navigating bot of the same size on this map
         # Allows O(1) path collision detection instead of O(len(walls))
         # Also allows easier construction of waypoint grid during path finding
-        for x in xrange(self.arena.height):
-            self.navbot_reachable.append([True] * self.arena.width)
-        for w in self.walls:
-            leftbound = max(0, w.left - self.body.width + 1)
-            rightbound = w.left + w.width
-            for x in xrange(leftbound, rightbound):
-                topbound = max(0, w.top - self.body.height + 1)
-                botbound = w.top + w.height
-                for y in xrange(topbound, botbound):
-                    self.navbot_reachable[x][y] = False
+        self.navbot_map = get_navmap(self.arena, self.walls, self.body.size)
+
+        # Allocating search arrays for a large map takes a while, so bots
+        # that search a slice at a time see that the pool holds a set before
+        # the match starts. Further sets are allocated as searches need them
+        if self.SEARCH_BUDGET is not None:
+            release_scratch(acquire_scratch(self.navbot_map.width *
+                                            self.navbot_map.height))
 
     """
     Computes an action sequence that will bring the bot from its current
@@ -89,6 +93,20 @@ class Navbot(Queuebot):
            reach that destination
     """
     def navigate(self, dest, start=None, direction=None):
+        path = self.plan(dest, start, direction)
+        if path is None:
+            return None
+        return self._construct_commands(path)
+
+    """
+    Finds the path navigate() would take, as the list of points on the way
+    IN:  - tuple of (x, y) specifying destination
+         - optional tuple of (x, y) to start from instead of the bot's location
+         - optional direction to start in instead of the bot's direction
+    OUT: - tuple of points from start to destination, or None if it is
+           impossible to reach that destination
+    """
+    def plan(self, dest, start=None, direction=None):
 
         # Initialize parameters if not given
         if start is None:
@@ -96,42 +114,175 @@ class Navbot(Queuebot):
         if direction is None:
             direction = self.direction
 
-        # Perform basic feasibility checks
-        if direction not in d.direction:
-            return None
-        if not self.arena.collidepoint(start):
-            return None
-        if not self.arena.collidepoint(dest):
-            return None
-        if not self.navbot_reachable[start[0]][start[1]]:
-            return None
-        if not self.navbot_reachable[dest[0]][dest[1]]:
+        # Look the map up again in case the walls changed since
+        self.navbot_map = navmap = get_navmap(self.arena, self.walls,
+                                              self.body.size)
+
+        if not self._is_feasible(navmap, start, dest, direction):
             return None
         if start == dest:
-            return []
-
-        # Find a path of waypoints to destination
-        path = self._find_path(start, dest, direction)
+            return (start,)
+
+        # Find a path of waypoints to destination, unless some bot on the
+        # same map already did. An impossible trip is cached as an empty path
+        key = (start, dest, direction)
+        path = navmap.paths.get(key)
+        if path is None:
+            path = tuple(self._find_path(start, dest, direction))
+            navmap.paths.put(key, path)
         if not path:
             return None
+        return path
+
+    """
+    Performs basic feasibility checks on a trip
+    IN:  - NavMap to check against
+         - tuple of (x, y) to start from
+         - tuple of (x, y) specifying destination
+         - direction to start in
+    OUT: - bool indicating whether a path may exist
+    """
+    def _is_feasible(self, navmap, start, dest, direction):
+        if direction not in d.direction:
+            return False
+        if not self.arena.collidepoint(start):
+            return False
+        if not self.arena.collidepoint(dest):
+            return False
+        if not navmap.is_reachable(*start):
+            return False
+        if not navmap.is_reachable(*dest):
+            return False
+
+        # Don't search for a way into a region the walls cut off
+        return start == dest or navmap.is_connected(start, dest)
 
-        # Construct command queue from path
+    """
+    Like navigate(), but for a destination that has moved a little since the
+    bot last queued a route (e.g. a bot being chased). Instead of searching
+    all the way from the bot again, the rest of the current route is kept up
+    to the point where it comes closest to the new destination, and only the
+    way from there on is searched for. That search covers about as much
+    ground as the destination moved, rather than the whole trip.
+    The result can be a little longer than a fresh route would be. If the bot
+    has strayed from its route, or the destination moved further than
+    REPAIR_RADIUS from where the route ends, a fresh route is planned instead.
+    IN:  - tuple of (x, y) specifying destination
+    OUT: - a list of actions to take, or None to mean that it is impossible to
+           reach that destination
+    """
+    def renavigate(self, dest):
+        path = self._repair_route(dest)
+        if path is None:
+            path = self.plan(dest)
+            if path is None:
+                return None
+        self.navbot_route = path
         return self._construct_commands(path)
 
     """
     An extra queue method to supplement existing Queuebot primitives. This
     function simply retrieves a list of actions required to navigate to dest,
     and adds them to the queue.
+    With a SEARCH_BUDGET, the search may not end in this decision. It then
+    carries on in the following ones, and the actions are queued once it does.
     IN:  - tuple of (x, y) specifying destination
-    OUT: - bool indicating whether a path was successfully found and queued
+    OUT: - bool indicating whether a path was successfully found and queued,
+           or is still being searched for
     """
     def queue_navigate(self, dest):
-        actions = self.navigate(dest)
+        if self.SEARCH_BUDGET is not None:
+            return self._queue_search(dest)
+        path = self.plan(dest)
+        if path is None:
+            return False
+        self._queue_route(path)
+        return True
+
+    """
+    Queue counterpart of renavigate(), like queue_navigate(). With a
+    SEARCH_BUDGET, only a route that can't be repaired is searched for over
+    several decisions: repairs search little enough to be done at once.
+    IN:  - tuple of (x, y) specifying destination
+    OUT: - bool indicating whether a path was successfully found and queued,
+           or is still being searched for
+    """
+    def queue_renavigate(self, dest):
+        if self.SEARCH_BUDGET is not None:
+            path = self._repair_route(dest)
+            if path is None:
+                return self._queue_search(dest)
+            self._queue_route(path)
+            return True
+        actions = self.renavigate(dest)
+        if actions is None:
+            return False
+        self.queue_all(actions)
+        return True
+
+    """
+    Like navigate(), but instead of searching a path of its own, the bot
+    follows the flow field towards dest, which is shared with every other bot
+    heading there (see flowfield.py). This pays off when several bots chase
+    the same target. The route can differ a little from the one navigate()
+    would find.
+    IN:  - tuple of (x, y) specifying destination
+    OUT: - a list of actions to take, or None to mean that it is impossible to
+           reach that destination
+    """
+    def follow(self, dest):
+        start = self.get_location()
+        self.navbot_map = navmap = get_navmap(self.arena, self.walls,
+                                              self.body.size)
+        if not self._is_feasible(navmap, start, dest, self.direction):
+            return None
+        if start == dest:
+            path = (start,)
+        else:
+            field = get_flow_field(navmap, dest)
+            if field is None:
+                return None
+            path = field.get_path(start, self.direction, dest)
+            if path is None:
+                return None
+        self.navbot_route = path
+        return self._construct_commands(path)
+
+    """
+    Queue counterpart of follow(), like queue_navigate()
+    IN:  - tuple of (x, y) specifying destination
+    OUT: - bool indicating whether a path was successfully found and queued
+    """
+    def queue_follow(self, dest):
+        actions = self.follow(dest)
         if actions is None:
             return False
         self.queue_all(actions)
         return True
 
+    """
+    Lets subclasses know if a route is still being searched for, see
+    SEARCH_BUDGET
+    """
+    def is_navigating(self):
+        return self.navbot_search is not None
+
+    """
+    Overridden from Queuebot to also drop a route still being searched for
+    """
+    def clear_queue(self):
+        Queuebot.clear_queue(self)
+        self._drop_search()
+
+    """
+    Overridden from Virtualbot to carry on with an unfinished search before
+    the subclass is asked for an action
+    """
+    def update_status(self, status):
+        Queuebot.update_status(self, status)
+        if self.navbot_search is not None:
+            self._continue_search()
+
     """
     Main entry point from realbot into the navbot, overridden from virtualbot.
     Updates status and asks subclasses for an action. Manages the command
@@ -153,6 +304,91 @@ class Navbot(Queuebot):
             if self.get_location() == checkpoints[i]:
                 self.queue_navigate(checkpoints[i+1])
 
+    """
+    Queues the actions to follow a path, and remembers it as the route
+    """
+    def _queue_route(self, path):
+        self.navbot_route = path
+        self.queue_all(self._construct_commands(path))
+
+    """
+    Starts a search from the bot's location that is run SEARCH_BUDGET
+    waypoints at a time, see queue_navigate(). Asking for the same trip again
+    while it is searched for leaves the search be.
+    IN:  - tuple of (x, y) specifying destination
+    OUT: - bool indicating whether a path was found and queued, or is still
+           being searched for
+    """
+    def _queue_search(self, dest):
+        start = self.get_location()
+        key = (start, dest, self.direction)
+        if self.navbot_search is not None and self.navbot_search[0] == key:
+            return True
+        self._drop_search()
+
+        self.navbot_map = navmap = get_navmap(self.arena, self.walls,
+                                              self.body.size)
+        if not self._is_feasible(navmap, start, dest, self.direction):
+            return False
+        if start == dest:
+            return True
+
+        # The path cache isn't looked at: a cached path would be ready at once
+        # where a search takes several decisions, and whether a path is cached
+        # depends on what other bots did, so the bot would act differently
+        # depending on them. The path found is cached for plan() though
+        # Paths looked up in the map's path database, or planned over the
+        # cluster graph for long trips, are found at once instead, which takes
+        # less than a slice of searching would
+        path = self._find_quick_path(start, dest, self.direction)
+        if path is not None:
+            path = tuple(path)
+            navmap.paths.put(key, path)
+            self._queue_route(path)
+            return True
+
+        # A search that waits between decisions can't use the search arrays
+        # shared by the thread, so it takes a set from the pool
+        search = Search(navmap, start, dest, self.direction,
+                        acquire_scratch(navmap.width * navmap.height))
+        self.navbot_search = (key, search)
+        return self._continue_search()
+
+    """
+    Drops the unfinished search, if any, handing its search arrays back
+    """
+    def _drop_search(self):
+        if self.navbot_search is not None:
+            release_scratch(self.navbot_search[1].scratch)
+            self.navbot_search = None
+
+    """
+    Searches on for another SEARCH_BUDGET waypoints, and queues the route
+    once it is found. The search is dropped if the bot has since moved or
+    turned, since the route would no longer start where the bot is.
+    OUT: - bool indicating whether a path was found and queued, or is still
+           being searched for
+    """
+    def _continue_search(self):
+        key, search = self.navbot_search
+        if key[0] != self.get_location() or key[2] != self.direction:
+            self._drop_search()
+            return False
+        # The search is only kept if the slice ends normally, so that one cut
+        # short by an overrun (see Dispatcher) isn't picked up half-updated.
+        # Its search arrays are then left out of the pool too
+        self.navbot_search = None
+        if not search.step(self.SEARCH_BUDGET):
+            self.navbot_search = (key, search)
+            return True
+        path = tuple(search.get_path())
+        release_scratch(search.scratch)
+        search.navmap.paths.put(key, path)
+        if not path:
+            return False
+        self._queue_route(path)
+        return True
+
     """
     Private function that takes a path of waypoints and converts it into a
     series of actions to take.
@@ -188,6 +424,86 @@ class Navbot(Queuebot):
             prev = cur
         return commands
 
+    """
+    Reroutes the rest of the current route to a new destination, see
+    renavigate()
+    OUT: - tuple of points from the bot's location to dest, or None if the
+           route can't be repaired
+    """
+    def _repair_route(self, dest):
+        route = self.navbot_route
+        if not route or self._distance(route[-1], dest) > self.REPAIR_RADIUS:
+            return None
+
+        # Find where on the route the bot is. Between decisions it can be
+        # anywhere along a straight stretch, not just at a waypoint
+        start = self.get_location()
+        rest = None
+        if start == route[-1]:
+            rest = (start,)
+        for i in xrange(len(route)-1):
+            if self._on_segment(start, route[i], route[i+1]):
+                rest = (start,) + route[i+1:]
+                break
+        if rest is None:
+            return None
+
+        # Leave the route where it comes closest to the new destination, and
+        # search the way from there
+        j = min(xrange(len(rest)), key=lambda k: self._distance(rest[k], dest))
+        if j == 0:
+            direction = self.direction
+        else:
+            direction = self._calculate_direction(rest[j-1], rest[j])
+        suffix = self.plan(dest, rest[j], direction)
+        if suffix is None:
+            return None
+
+        # Closest in a straight line isn't closest on foot. If the way on has
+        # to go far around a wall, a fresh route is likely much shorter
+        detour = self._length(suffix) - self._distance(rest[j], dest)
+        if detour > self.REPAIR_DETOUR:
+            return None
+
+        # The way on may double back over the route. Cut out any loops
+        path = []
+        seen = {}
+        for point in rest[:j] + suffix:
+            if point in seen:
+                for dropped in path[seen[point]+1:]:
+                    del seen[dropped]
+                del path[seen[point]+1:]
+            else:
+                seen[point] = len(path)
+                path.append(point)
+        return tuple(path)
+
+    """
+    Utility function for the Manhattan distance between two points
+    """
+    def _distance(self, a, b):
+        return abs(a[0]-b[0]) + abs(a[1]-b[1])
+
+    """
+    Utility function for the length of a path
+    """
+    def _length(self, path):
+        return sum(self._distance(path[i], path[i+1])
+                   for i in xrange(len(path)-1))
+
+    """
+    Utility function to determine if loc lies on the straight stretch from a
+    up to, but not including, b
+    """
+    def _on_segment(self, loc, a, b):
+        if loc == a:
+            return True
+        if a[0] == b[0] == loc[0]:
+            return self._between(loc[1], a[1], b[1]-a[1])
+        if a[1] == b[1] == loc[1]:
+            return self._between(loc[0], a[0], b[0]-a[0])
+        return False
+
     """
     OUT: - tuple representing the bot's position as (x, y)
     """
@@ -220,83 +536,39 @@ class Navbot(Queuebot):
     waypoint grid. The idea is to walk to a "waypoint" every 10 pixels, starting
     from the bot's current position. Ideally this will split the arena into
     10x10 square chunks, and when computing a path, the search algorithm will
-    consider traversing only these waypoints.
+    consider traversing only these waypoints. The search itself lives in
+    astar.py.
     IN:  - tuple indicating start point
          - tuple indicating destination point
+         - direction the bot starts out facing
     OUT: - list containing points to follow to get to destination
     """
     def _find_path(self, start, dest, direction):
-
-        # These difference offsets are used to place intermediate waypoints on
-        # the axes of the destination
-        x_diff = (dest[0]-start[0]) % 10
-        y_diff = (dest[1]-start[1]) % 10
-
-        # targets is a min-heap that contains candidate waypoints for visiting
-        targets = []
-        heapq.heappush(targets, Navbot.Waypoint(start[0], start[1], self._heuristic(start, dest), 0, None, direction))
-
-        # waypoints save information about each visited waypoint
-        waypoints = {}
-        waypoints[start] = targets[0]
-        while targets:
-
-            # Look for the waypoint closest to destination
-            wp = heapq.heappop(targets)
-            cur = (wp.x, wp.y)
-
-            # Uncomment line below to see how A* searches
-            # raw_input("{0} {1} {2}".format(cur, wp.priority, wp.heuristic))
-
-            if cur == dest:
-                break
-            for i in xrange(4):
-                # Determine how to move
-                x_off, y_off = self._compute_offsets(cur, dest, i, x_diff, y_diff)
-                next_x = wp.x + x_off
-                next_y = wp.y + y_off
-                next_cur = (next_x, next_y)
-
-                # Make sure next location is legal, reachable, and unseen
-                if (next_x < 0 or next_x >= self.arena.width or
-                    next_y < 0 or next_y >= self.arena.height or
-                    not self.navbot_reachable[next_x][next_y] or
-                    next_cur in waypoints):
-                    continue
-
-                # Compute cost to get there
-                cost = wp.distance
-                cost += (abs(x_off) + abs(y_off)) * d.duration.WALK
-                diff_dir = (wp.direction - i) % 4
-                if diff_dir == 1 or diff_dir == 3:
-                    cost += d.duration.TURN
-                elif diff_dir == 2:
-                    cost += d.duration.TURN * 2
-
-                # Save as candidate location to visit
-                next_wp = Navbot.Waypoint(next_x, next_y, self._heuristic(next_cur, dest), cost, cur, i)
-                waypoints[next_cur] = next_wp
-                heapq.heappush(targets, next_wp)
-
-        # If a path is not found
-        if dest not in waypoints:
-            return []
-
-        # Retrieve path of waypoints
-        loc = dest
-        path = []
-        while loc:
-            path.append(loc)
-            loc = waypoints[loc].prev
-        path.reverse()
-
-        return path
+        path = self._find_quick_path(start, dest, direction)
+        if path is not None:
+            return path
+        return find_path(self.navbot_map, start, dest, direction)
 
     """
-    The heuristic for A*. Simply the Manhattan distance divided by speed.
+    Finds a path without searching the waypoint grid: by looking it up in the
+    path database loaded for the map (see pathdatabase.py) if there is one, or
+    else, for a trip of at least LONG_TRIP pixels, by planning it over the
+    map's cluster graph
+    IN:  - tuple indicating start point
+         - tuple indicating destination point
+         - direction the bot starts out facing
+    OUT: - list containing points to follow to get to destination, or None if
+           no path was found this way
     """
-    def _heuristic(self, loc, dest):
-        return (abs(loc[0]-dest[0]) + abs(loc[1]-dest[1])) * d.duration.WALK
+    def _find_quick_path(self, start, dest, direction):
+        database = get_path_database(self.navbot_map)
+        if database is not None:
+            path = database.find_path(self.navbot_map, start, dest, direction)
+            if path is not None:
+                return path
+        if self._distance(start, dest) < self.LONG_TRIP:
+            return None
+        return get_hierarchy(self.navbot_map).find_path(start, dest, direction)
 
     """
     Utility function to determine if loc is between base and base+offset
@@ -304,34 +576,3 @@ class Navbot(Queuebot):
     def _between(self, loc, base, offset):
         return (loc < base and loc > base+offset or
                 loc > base and loc < base+offset)
-
-    """
-    Computes how far in the x-y direction to move for the next waypoint. The
-    ugly if statement accounts for intermediate waypoints that are on the
-    destination point's axes (because the destination is rarely a multiple of
-    10 pixels distance from start).
-    """
-    def _compute_offsets(self, cur, dest, direction, x_diff, y_diff):
-        x_off = d.DX[direction] * 10
-        y_off = d.DY[direction] * 10
-        if direction == 0:
-            if cur[0] == dest[0]:
-                x_off = 10-x_diff
-            elif self._between(dest[0], cur[0], 10):
-                x_off = x_diff
-        elif direction == 1:
-            if cur[1] == dest[1]:
-                y_off = -y_diff
-            elif self._between(dest[1], cur[1], -10):
-                y_off = y_diff-10
-        elif direction == 2:
-            if cur[0] == dest[0]:
-                x_off = -x_diff
-            elif self._between(dest[0], cur[0], -10):
-                x_off = x_diff-10
-        elif direction == 3:
-            if cur[1] == dest[1]:
-                y_off = 10-y_diff
-            elif self._between(dest[1], cur[1], 10):
-                y_off = y_diff
-        return (x_off, y_off)
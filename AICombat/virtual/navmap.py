@@ -0,0 +1,397 @@
+"""
+navmap.py
+
+Map data used by navigating virtualbots. A NavMap describes which positions a
+bot of a given size can occupy without overlapping a wall, i.e. the
+configuration space of the bot. It only depends on the arena, the walls and
+the bot size, so it is built once and shared by every bot that asks for the
+same combination (within an arena and across arenas in the same process).
+
+A NavMap also caches the paths found on it (see Navbot.navigate), so that a
+route any bot already planned doesn't have to be searched for again. Paths
+are only valid for the walls they were found among, and a map with different
+walls is a different NavMap with a cache of its own, so changing the walls
+leaves the old paths behind.
+
+A NavMap also labels which positions are connected to each other, so that a
+destination cut off from the bot by walls is rejected without searching.
+
+The flow fields bots follow (see flowfield.py) are cached on the NavMap too,
+as is the cluster graph used to plan long trips (see hierarchy.py). Path
+databases built ahead of time for a map are found through it as well.
+
+Bots must treat a NavMap as read-only, except for its caches.
+"""
+
+# Global imports
+import bisect
+import hashlib
+import struct
+import threading
+from array import array
+
+# Local imports
+from utils.interrupts import critical
+from utils.lrucache import LRUCache
+
+# Number of paths and flow fields each NavMap remembers
+PATH_CACHE_SIZE = 256
+FIELD_CACHE_SIZE = 16
+
+# Number of NavMaps kept around. Walls that change give a new NavMap, so the
+# ones of layouts no longer played are let go
+NAVMAP_CACHE_SIZE = 8
+
+# Furthest apart two consecutive waypoints of a path can be, see astar.py
+WAYPOINT_STEP = 10
+
+# Cache of the NavMaps built most recently, keyed by (arena, walls, bot size)
+_navmaps = LRUCache(NAVMAP_CACHE_SIZE)
+
+"""
+Retrieves the NavMap for a map and bot size, building it on first use (or
+again, if it hasn't been used for a while)
+IN:  - pygame.Rect representing the arena
+     - list of pygame.Rect representing the walls
+     - 2-tuple representing the bot size in (width, height)
+OUT: - the shared NavMap
+"""
+def get_navmap(arena, walls, size):
+    key = (tuple(arena), tuple(tuple(w) for w in walls), tuple(size))
+    navmap = _navmaps.get(key)
+    if navmap is None:
+        navmap = NavMap(arena, walls, size)
+        _navmaps.put(key, navmap)
+    return navmap
+
+class NavMap(object):
+
+    """
+    Computes all reachable and unreachable positions. The result is a compact
+    bitmap with one byte per pixel, stored column by column: the position
+    (x, y) lives at index x*height + y. The connected regions of the map are
+    labelled in components, laid out the same way.
+    IN:  - pygame.Rect representing the arena
+         - list of pygame.Rect representing the walls
+         - 2-tuple representing the bot size in (width, height)
+    """
+    def __init__(self, arena, walls, size):
+        self.width = arena.width
+        self.height = arena.height
+        self.size = tuple(size)
+        self.reachable = bytearray(b"\x01") * (self.width * self.height)
+
+        # Paths found on this map, keyed by (start, dest, direction)
+        self.paths = LRUCache(PATH_CACHE_SIZE)
+
+        # Flow fields towards goals on this map, keyed by goal cell, see
+        # flowfield.py
+        self.fields = LRUCache(FIELD_CACHE_SIZE)
+
+        # Cluster graph for long trips, built on first use, see hierarchy.py
+        self.hierarchy = None
+
+        # Identifies the map to path databases, see get_digest()
+        self.digest = None
+
+        # How much searching for paths on this map took, see record_search()
+        self.search_lock = threading.Lock()
+        self.searches = 0
+        self.expansions = 0
+        self.search_time = 0.0
+
+        self._block(self.reachable, walls)
+        self._label_components(walls)
+
+    """
+    IN:  - x and y coordinate of the bot's top-left corner
+    OUT: - bool indicating whether the bot fits there. Positions outside the
+           arena are never reachable
+    """
+    def is_reachable(self, x, y):
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return False
+        return self.reachable[x*self.height + y] == 1
+
+    """
+    Finds the waypoints of a waypoint grid nearest to a position: the corners
+    of the grid square the position lies in, or fewer if it lies on the grid
+    IN:  - tuple of (x, y) of the position
+         - tuple of (x, y) of any waypoint of the grid
+    OUT: - list of (x, y) of those waypoints that are reachable
+    """
+    def get_waypoints_around(self, loc, origin):
+        around = []
+        for coord, axis in ((loc[0], origin[0]), (loc[1], origin[1])):
+            below = coord - (coord - axis) % WAYPOINT_STEP
+            if below == coord:
+                around.append((coord,))
+            else:
+                around.append((below, below + WAYPOINT_STEP))
+        return [(x, y) for x in around[0] for y in around[1]
+                if self.is_reachable(x, y)]
+
+    """
+    Finds a way between two nearby positions in at most two straight
+    stretches, turning either after moving across or after moving down. Like
+    the waypoint searches, only the corner is checked, not the whole way.
+    IN:  - tuples of (x, y) for the two positions
+         - optional bool, whether to try moving across first, or down first
+    OUT: - list of the points after a up to and including b, or None if
+           neither corner is reachable
+    """
+    def get_detour(self, a, b, across_first=True):
+        if a == b:
+            return []
+        if a[0] == b[0] or a[1] == b[1]:
+            return [b]
+        corners = ((b[0], a[1]), (a[0], b[1]))
+        if not across_first:
+            corners = corners[::-1]
+        for corner in corners:
+            if self.is_reachable(*corner):
+                return [corner, b]
+        return None
+
+    """
+    Picks the waypoint of the fixed grid (WAYPOINT_STEP pixels apart, starting
+    at (0, 0)) to get on at from a position, or off at to get there
+    IN:  - tuple of (x, y) of the position to get on from
+         - tuple of (x, y) of the other end of the trip
+    OUT: - tuple of ((x, y) of the waypoint, list of points on the way from
+           the position to it), or None if no waypoint nearby can be reached
+    """
+    def get_on_grid(self, loc, other):
+        best = None
+        for x, y in self.get_waypoints_around(loc, (0, 0)):
+            way = self.get_detour(loc, (x, y))
+            if way is None:
+                continue
+            length = (abs(x - loc[0]) + abs(y - loc[1]) +
+                      abs(x - other[0]) + abs(y - other[1]))
+            if best is None or length < best[0]:
+                best = (length, (x, y), way)
+        if best is None:
+            return None
+        return best[1:]
+
+    """
+    IN:  - x and y coordinate of the bot's top-left corner
+    OUT: - int, label of the connected region of the map the position lies
+           in, or 0 if the position is unreachable or outside the arena
+    """
+    def get_component(self, x, y):
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return 0
+        return self.components[x*self.height + y]
+
+    """
+    Tells whether a bot could possibly get from one position to the other.
+    False means no path exists. True only means that the walls don't separate
+    the two, the waypoint grid may still fail to find a way through.
+    IN:  - tuples of (x, y) for the two positions
+    OUT: - bool indicating whether both are reachable and connected
+    """
+    def is_connected(self, a, b):
+        component = self.get_component(*a)
+        return component != 0 and component == self.get_component(*b)
+
+    """
+    Picks a random reachable position, uniformly over the positions of one
+    connected region or of the whole map
+    IN:  - random.Random to draw from
+         - optional component label to pick the position in
+    OUT: - tuple of (x, y), or None if there is no such position
+    """
+    def random_position(self, rng, component=None):
+        if component is None:
+            runs, sizes = self.runs, self.run_sizes
+        else:
+            runs, sizes = self.component_runs.get(component, ((), ()))
+        if not runs:
+            return None
+        n = rng.randrange(sizes[-1])
+        i = bisect.bisect_right(sizes, n)
+        index = runs[i][1] - (sizes[i] - n)
+        return (index // self.height, index % self.height)
+
+    """
+    Marks the positions where a bot would overlap a wall as unreachable. Each
+    wall blocks a rectangle of positions, which is filled one column slice at
+    a time.
+    IN:  - bytearray laid out like reachable
+         - list of pygame.Rect representing the walls
+    """
+    def _block(self, reachable, walls):
+
+        # A bot at (x, y) overlaps a wall iff x lies in
+        # (wall.left - bot width, wall.right) and likewise for y
+        height = self.height
+        for w in walls:
+            leftbound = max(0, w.left - self.size[0] + 1)
+            rightbound = min(self.width, w.left + w.width)
+            topbound = max(0, w.top - self.size[1] + 1)
+            botbound = min(height, w.top + w.height)
+            if topbound >= botbound:
+                continue
+            blocked = bytearray(botbound - topbound)
+            for x in xrange(leftbound, rightbound):
+                reachable[x*height+topbound:x*height+botbound] = blocked
+
+    """
+    Labels the connected regions of reachable positions, where positions
+    connect to their four neighbours. The labelling works on runs, the
+    stretches of reachable positions in each column, of which there are only a
+    handful per column: runs overlapping a run of the previous column are
+    merged, then every run is filled with the label of its region.
+    A* only checks the waypoints it steps on, so it can step over a wall that
+    blocks fewer than WAYPOINT_STEP positions across. Such a wall separates
+    nothing as far as A* is concerned, so it is left out of the labelling.
+    IN:  - list of pygame.Rect representing the walls
+    """
+    def _label_components(self, walls):
+        width = self.width
+        height = self.height
+        open_map = self.reachable
+        thick = [w for w in walls
+                 if w.width + self.size[0] - 1 >= WAYPOINT_STEP and
+                    w.height + self.size[1] - 1 >= WAYPOINT_STEP]
+        if len(thick) < len(walls):
+            open_map = bytearray(b"\x01") * (width * height)
+            self._block(open_map, thick)
+
+        # Find the runs of every column, as (start, end) indices into the map
+        runs = []
+        column_runs = []
+        for x in xrange(width):
+            first = len(runs)
+            y = x*height
+            end = y + height
+            while y < end:
+                y = open_map.find(b"\x01", y, end)
+                if y == -1:
+                    break
+                stop = open_map.find(b"\x00", y, end)
+                if stop == -1:
+                    stop = end
+                runs.append((y, stop))
+                y = stop
+            column_runs.append((first, len(runs)))
+
+        # Merge overlapping runs of neighbouring columns, with union-find
+        parent = range(len(runs))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for x in xrange(1, width):
+            i, i_end = column_runs[x-1]
+            j, j_end = column_runs[x]
+            while i < i_end and j < j_end:
+                top = runs[i][0] + height
+                bottom = runs[i][1] + height
+                if top < runs[j][1] and runs[j][0] < bottom:
+                    a, b = find(i), find(j)
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+                if bottom <= runs[j][1]:
+                    i += 1
+                else:
+                    j += 1
+
+        # Fill in the labels, numbered from 1 in column order
+        self.components = array("i", [0]) * (width * height)
+        labels = {}
+        regions = {}
+        for i, (start, end) in enumerate(runs):
+            label = labels.setdefault(find(i), len(labels) + 1)
+            self.components[start:end] = array("i", [label]) * (end - start)
+            regions.setdefault(label, []).append((start, end))
+        self.component_count = len(labels)
+
+        # Positions only opened up by leaving thin walls out stay unreachable.
+        # For random_position(), keep the reachable parts of each region's
+        # runs, along with the running total of their lengths
+        self.component_runs = {}
+        all_runs = []
+        for label, region in regions.iteritems():
+            parts = self._reachable_parts(region)
+            if open_map is not self.reachable:
+                for start, end in region:
+                    self.components[start:end] = array("i", [0]) * (end - start)
+                for start, end in parts:
+                    self.components[start:end] = (
+                        array("i", [label]) * (end - start))
+            self.component_runs[label] = (parts, self._running_total(parts))
+            all_runs.extend(parts)
+        all_runs.sort()
+        self.runs = all_runs
+        self.run_sizes = self._running_total(all_runs)
+
+    """
+    IN:  - list of (start, end) runs of positions
+    OUT: - list of the reachable stretches within those runs
+    """
+    def _reachable_parts(self, runs):
+        reachable = self.reachable
+        parts = []
+        for start, end in runs:
+            while start < end:
+                start = reachable.find(b"\x01", start, end)
+                if start == -1:
+                    break
+                stop = reachable.find(b"\x00", start, end)
+                if stop == -1:
+                    stop = end
+                parts.append((start, stop))
+                start = stop
+        return parts
+
+    """
+    IN:  - list of (start, end) runs of positions
+    OUT: - list of the number of positions in each run and all runs before it
+    """
+    def _running_total(self, runs):
+        sizes = []
+        total = 0
+        for start, end in runs:
+            total += end - start
+            sizes.append(total)
+        return sizes
+
+    """
+    OUT: - str, digest of the size of the map and of which positions are
+           reachable, by which path databases built for the map recognise it
+           (see pathdatabase.py)
+    """
+    def get_digest(self):
+        if self.digest is None:
+            md5 = hashlib.md5(struct.pack("<II", self.width, self.height))
+            md5.update(self.reachable)
+            self.digest = md5.digest()
+        return self.digest
+
+    """
+    Adds a path search to the map's statistics
+    IN:  - number of waypoints the search expanded
+         - seconds the search took
+    """
+    def record_search(self, expansions, seconds):
+        with critical, self.search_lock:
+            self.searches += 1
+            self.expansions += expansions
+            self.search_time += seconds
+
+    """
+    OUT: - dict with the number of path searches run on this map, the
+           waypoints they expanded, the total ms they took, and the ns spent
+           per expanded waypoint
+    """
+    def get_search_stats(self):
+        with self.search_lock:
+            return {"searches": self.searches,
+                    "expansions": self.expansions,
+                    "total_ms": self.search_time * 1000,
+                    "ns_per_expansion": (self.search_time * 1e9 /
+                                         max(self.expansions, 1))}
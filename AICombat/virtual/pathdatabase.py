@@ -0,0 +1,323 @@
+"""
+pathdatabase.py
+
+Path databases for maps known ahead of time (e.g. tournament maps). A path
+database holds, for every waypoint of the map, the first move to take towards
+every other waypoint. Finding a path is then a matter of looking up one move
+after another, without any searching. Building one takes a breadth first
+search from every waypoint, so it is done offline, see pathdb.py.
+
+The waypoints are those of the fixed grid, WAYPOINT_STEP pixels apart starting
+at (0, 0), numbered i*rows + j like in hierarchy.py. For every pair of
+waypoints the database keeps the moves that start a shortest way, as a mask
+with bit i set for d.direction i, so that a bot can keep going straight when
+that is one of them. The masks of one source are compressed by run-length:
+a run is stored as one int, (first target << 4) | mask, and holds until the
+next run starts. Only one move per target is needed though, so a run goes on
+for as long as its targets have a move in common, and keeps only those. On
+the stock arena this takes the database down to about a twentieth of one mask
+per pair. Targets that can't be reached from the source have no move, so they
+are left to whichever run they fall in, and the database instead keeps which
+part of the grid every waypoint is connected to. Looking up a move is then a
+binary search among the runs of the source.
+
+The paths found take as few waypoint steps as A*'s, but getting on and off the
+fixed grid costs a turn or two that A* can do without, which shows most on
+short trips.
+
+Loaded databases are registered by the map they were built for, which
+NavMaps recognise by their digest (see NavMap.get_digest).
+"""
+
+# Global imports
+import bisect
+import struct
+import sys
+from array import array
+
+# Local imports
+import real.definitions as d
+from virtual.navmap import WAYPOINT_STEP
+
+# Start of a database file: magic, version, columns and rows of the grid,
+# number of runs, and the digest of the map. The components, offsets and runs
+# of the database follow, as little-endian unsigned ints
+HEADER = struct.Struct("<4sHHHI16s")
+MAGIC = b"APDB"
+VERSION = 1
+
+# Every database loaded so far, keyed by map digest
+_databases = {}
+
+"""
+Loads a database from a file, and registers it for its map
+IN:  - str, file name
+OUT: - the PathDatabase
+"""
+def load(filename):
+    with open(filename, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("{0} is not a path database".format(filename))
+        magic, version, columns, rows, count, digest = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{0} is not a path database".format(filename))
+        components = array("I")
+        components.fromfile(f, columns * rows)
+        offsets = array("I")
+        offsets.fromfile(f, columns * rows + 1)
+        runs = array("I")
+        runs.fromfile(f, count)
+    if sys.byteorder == "big":
+        components.byteswap()
+        offsets.byteswap()
+        runs.byteswap()
+    database = PathDatabase(columns, rows, digest, components, offsets, runs)
+    _databases[digest] = database
+    return database
+
+"""
+Retrieves the database loaded for a map
+IN:  - NavMap to look for
+OUT: - the PathDatabase, or None if there is none
+"""
+def get_path_database(navmap):
+    if not _databases:
+        return None
+    return _databases.get(navmap.get_digest())
+
+"""
+Builds the database of a map, with a breadth first search from every reachable
+waypoint
+IN:  - NavMap to build for
+     - optional function called with (waypoints done, waypoints in all) now
+       and then, to report progress
+OUT: - the PathDatabase
+"""
+def build(navmap, progress=None):
+    columns = -(-navmap.width // WAYPOINT_STEP)
+    rows = -(-navmap.height // WAYPOINT_STEP)
+    count = columns * rows
+
+    # Neighbours of every waypoint, as (waypoint, bit of the move there)
+    height = navmap.height
+    reachable = navmap.reachable
+    is_open = [reachable[i*WAYPOINT_STEP*height + j*WAYPOINT_STEP] == 1
+               for i in xrange(columns) for j in xrange(rows)]
+    neighbours = [[] for node in xrange(count)]
+    for node in xrange(count):
+        if not is_open[node]:
+            continue
+        i, j = divmod(node, rows)
+        for move in xrange(4):
+            ni = i + d.DX[move]
+            nj = j + d.DY[move]
+            if 0 <= ni < columns and 0 <= nj < rows and is_open[ni*rows + nj]:
+                neighbours[node].append((ni*rows + nj, 1 << move))
+
+    # Label the parts of the grid connected to each other, from 1 up. Closed
+    # waypoints are left at 0
+    components = array("I", [0]) * count
+    label = 0
+    for node in xrange(count):
+        if not is_open[node] or components[node]:
+            continue
+        label += 1
+        components[node] = label
+        frontier = [node]
+        while frontier:
+            next_node = frontier.pop()
+            for other, bit in neighbours[next_node]:
+                if not components[other]:
+                    components[other] = label
+                    frontier.append(other)
+
+    offsets = array("I", [0]) * (count + 1)
+    runs = array("I")
+    for source in xrange(count):
+        offsets[source] = len(runs)
+        if progress and source % 1000 == 0:
+            progress(source, count)
+        if not is_open[source]:
+            continue
+
+        # Every waypoint inherits the first moves of the waypoints one step
+        # closer to the source, a level of the search at a time
+        steps = [-1] * count
+        masks = bytearray(count)
+        steps[source] = 0
+        frontier = []
+        for node, bit in neighbours[source]:
+            steps[node] = 1
+            masks[node] = bit
+            frontier.append(node)
+        level = 1
+        while frontier:
+            level += 1
+            next_frontier = []
+            for node in frontier:
+                mask = masks[node]
+                for next_node, bit in neighbours[node]:
+                    next_steps = steps[next_node]
+                    if next_steps == -1:
+                        steps[next_node] = level
+                        masks[next_node] = mask
+                        next_frontier.append(next_node)
+                    elif next_steps == level:
+                        masks[next_node] |= mask
+            frontier = next_frontier
+
+        # Compress. Targets without a move don't start a run of their own
+        last = 0
+        for target in xrange(count):
+            mask = masks[target]
+            if mask & last:
+                last &= mask
+                runs[-1] = runs[-1] & ~15 | last
+            elif mask:
+                runs.append(target << 4 | mask)
+                last = mask
+    offsets[count] = len(runs)
+    if progress:
+        progress(count, count)
+    return PathDatabase(columns, rows, navmap.get_digest(), components,
+                        offsets, runs)
+
+class PathDatabase(object):
+
+    """
+    IN:  - columns and rows of the waypoint grid
+         - str, digest of the map
+         - array of int, label of the part of the grid each waypoint is
+           connected to, 0 for closed waypoints
+         - array of int, where the runs of each waypoint start, and where the
+           last one ends
+         - array of int, the runs of every waypoint in a row
+    """
+    def __init__(self, columns, rows, digest, components, offsets, runs):
+        self.columns = columns
+        self.rows = rows
+        self.digest = digest
+        self.components = components
+        self.offsets = offsets
+        self.runs = runs
+
+    """
+    Writes the database to a file
+    IN:  - str, file name
+    """
+    def save(self, filename):
+        components, offsets, runs = self.components, self.offsets, self.runs
+        if sys.byteorder == "big":
+            components = array("I", components)
+            components.byteswap()
+            offsets = array("I", offsets)
+            offsets.byteswap()
+            runs = array("I", runs)
+            runs.byteswap()
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.columns, self.rows,
+                                len(runs), self.digest))
+            components.tofile(f)
+            offsets.tofile(f)
+            runs.tofile(f)
+
+    """
+    OUT: - int, number of bytes the tables take up
+    """
+    def get_size(self):
+        return sum(len(table) * table.itemsize for table
+                   in (self.components, self.offsets, self.runs))
+
+    """
+    Looks up the moves starting a shortest way between two waypoints
+    IN:  - int, waypoint to move from
+         - int, waypoint to head for
+    OUT: - int, mask with bit i set if moving in d.direction i is one of them,
+           or 0 if there is none
+    """
+    def get_moves(self, source, target):
+        start = self.offsets[source]
+        i = bisect.bisect_right(self.runs, target << 4 | 15, start,
+                                self.offsets[source + 1]) - 1
+        if i < start:
+            return 0
+        return self.runs[i] & 15
+
+    """
+    Finds a path by looking up one move after another. The way gets on and
+    off the grid in short straight stretches (see NavMap.get_on_grid), turned
+    so as to line up with the first and last moves on the grid. Along the way
+    the bot keeps going straight where it can, and otherwise turns as little
+    as it can.
+    IN:  - NavMap the database was built for
+         - tuple indicating start point
+         - tuple indicating destination point
+         - direction the bot starts out facing
+    OUT: - list containing points to follow to get to destination, or None if
+           the database has no way there
+    """
+    def find_path(self, navmap, start, dest, direction):
+        on = navmap.get_on_grid(start, dest)
+        off = navmap.get_on_grid(dest, start)
+        if on is None or off is None:
+            return None
+        (x, y), way_on = on
+        node = (x // WAYPOINT_STEP) * self.rows + y // WAYPOINT_STEP
+        (x, y), way_off = off
+        target = (x // WAYPOINT_STEP) * self.rows + y // WAYPOINT_STEP
+        if self.components[node] != self.components[target]:
+            return None
+        if way_on:
+            direction = self._heading(([start] + way_on)[-2], way_on[-1])
+
+        # Every move is a step closer, so the walk can only go on longer than
+        # any shortest way if the database doesn't match the map
+        i, j = divmod(node, self.rows)
+        grid = [(i * WAYPOINT_STEP, j * WAYPOINT_STEP)]
+        for _ in xrange(len(self.offsets)):
+            if node == target:
+                break
+            moves = self.get_moves(node, target)
+            if not moves:
+                return None
+            if moves & (1 << direction):
+                move = direction
+            else:
+                move = min((m for m in xrange(4) if moves & (1 << m)),
+                           key=lambda m: ((direction - m) % 4 == 2, m))
+            i += d.DX[move]
+            j += d.DY[move]
+            node = i*self.rows + j
+            grid.append((i * WAYPOINT_STEP, j * WAYPOINT_STEP))
+            direction = move
+        else:
+            return None
+
+        # Get on moving down first if the way goes on across, and the other
+        # way round, so as to save a turn. Likewise for getting off
+        across = None
+        if len(grid) > 1:
+            across = grid[1][1] == grid[0][1]
+        way_on = navmap.get_detour(start, grid[0], not across)
+        if len(grid) > 1:
+            across = grid[-1][1] == grid[-2][1]
+        way_off = navmap.get_detour(grid[-1], dest, across is not False)
+        if way_on is None or way_off is None:
+            return None
+        path = [start] + way_on
+        path.extend(grid[1:])
+        path.extend(way_off)
+        return path
+
+    """
+    OUT: - direction of the straight stretch from a to b
+    """
+    def _heading(self, a, b):
+        if b[0] > a[0]:
+            return d.direction.RIGHT
+        if b[1] < a[1]:
+            return d.direction.UP
+        if b[0] < a[0]:
+            return d.direction.LEFT
+        return d.direction.DOWN
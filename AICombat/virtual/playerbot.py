@@ -25,6 +25,12 @@ class Playerbot(Queuebot):
     @Queuebot.queued
     def get_action(self, status):
 
+        # Without a display (e.g. in a headless simulation) there is no
+        # keyboard to read from, so just stand still
+        if not pygame.display.get_init():
+            self.queue_wait()
+            return
+
         # Uses pygame to retrieve all keys currently being pressed
         keys = pygame.key.get_pressed()
 
@@ -0,0 +1,261 @@
+"""
+remotebot.py
+
+Runs a virtualbot in a worker process of its own. The virtualbot can then use
+a core of its own, and if it crashes or hangs, the arena carries on without it
+(its realbot simply stands still).
+
+Observations and decisions are not pickled over a pipe. Each remote bot gets a
+slot of shared memory with a fixed layout:
+
+    header       sequence number, command, elapsed ms, number of bots seen
+    self         the bot's own status
+    bots         up to MAX_BOTS statuses of the bots in sight
+    decision     sequence number, whether it's valid, action and parameters
+
+The arena side writes the status straight into the slot and signals the
+worker, which rebuilds the status dict, calls get_action() on the real
+virtualbot and writes its decision back into the slot.
+
+To run a bot out of process, spawn it as Remote(SomeBot) instead of SomeBot:
+
+    bot_info = [(10, 100, Remote(Stalkerbot)), (350, 250, Dumbbot)]
+
+Worker processes are started with fork, so this needs a Unix-like system, and
+can't be used from inside a daemonic process (e.g. a Tournament worker).
+"""
+
+# Global imports
+import math
+import mmap
+import multiprocessing
+import struct
+import traceback
+import pygame
+
+# Local imports
+import real.definitions as d
+from utils.interrupts import critical
+from virtual.virtualbot import Virtualbot
+
+# Most bots in sight that are passed on, any more are left out
+MAX_BOTS = 32
+
+# Optional keys of a realbot state, in the order they are stored
+STATE_KEYS = ("distance", "max_distance", "cooldown", "next")
+
+# Optional keys of a decision, in the order they are stored
+DECISION_KEYS = ("distance", "direction")
+
+# Commands from the arena to the worker
+COMMAND_DECIDE = 0
+COMMAND_STOP = 1
+
+# Slot layout. A bot record is eid, body, direction, hp, ammo, then its state
+# as action, bitmask of the optional keys present, and their values
+HEADER = struct.Struct("<IIii")
+BOT = struct.Struct("<Q7i2i4d")
+DECISION = struct.Struct("<I2iidi")
+SELF_OFFSET = HEADER.size
+BOTS_OFFSET = SELF_OFFSET + BOT.size
+DECISION_OFFSET = BOTS_OFFSET + BOT.size * MAX_BOTS
+SLOT_SIZE = DECISION_OFFSET + DECISION.size
+
+"""
+Writes a bot's info dict into a slot
+"""
+def _pack_bot(slot, offset, info):
+    state = info["state"]
+    mask = 0
+    values = []
+    for i, key in enumerate(STATE_KEYS):
+        if key in state:
+            mask |= 1 << i
+            values.append(float(state[key]))
+        else:
+            values.append(0.0)
+    body = info["body"]
+    BOT.pack_into(slot, offset, info["eid"],
+                  body.left, body.top, body.width, body.height,
+                  info["direction"], info["hp"], info["ammo"],
+                  state["action"], mask, *values)
+
+"""
+Reads a bot's info dict back out of a slot
+"""
+def _unpack_bot(slot, offset):
+    fields = BOT.unpack_from(slot, offset)
+    state = {"action": fields[8]}
+    for i, key in enumerate(STATE_KEYS):
+        if fields[9] & (1 << i):
+            state[key] = _number(fields[10+i])
+    return {"type": "realbot",
+            "eid": fields[0],
+            "body": pygame.Rect(fields[1:5]),
+            "direction": fields[5],
+            "hp": fields[6],
+            "ammo": fields[7],
+            "state": state}
+
+"""
+Turns a stored double back into an int where it holds one
+"""
+def _number(value):
+    if math.isinf(value) or value != int(value):
+        return value
+    return int(value)
+
+"""
+Main loop of a worker process. Waits for statuses, asks the virtualbot and
+posts back its decisions until told to stop.
+"""
+def _serve(bot_class, arena_data, slot, observed, decided, pipe):
+    vbot = bot_class(arena_data)
+    pipe.send(vbot.image_path)
+    while True:
+        observed.acquire()
+        seq, command, elapsed, nbots = HEADER.unpack_from(slot, 0)
+        if command == COMMAND_STOP:
+            return
+
+        # Rebuild the status dict, see Realbot.compile_status()
+        status = _unpack_bot(slot, SELF_OFFSET)
+        status["elapsed"] = elapsed
+        status["objects"] = {"bots": [], "projectiles": [], "items": []}
+        for i in xrange(nbots):
+            bot = _unpack_bot(slot, BOTS_OFFSET + i * BOT.size)
+            status["objects"]["bots"].append(bot)
+
+        # A crashing virtualbot only loses this decision
+        try:
+            decision = vbot.get_action(status)
+            mask = 0
+            values = []
+            for i, key in enumerate(DECISION_KEYS):
+                if key in decision:
+                    mask |= 1 << i
+                    values.append(decision[key])
+                else:
+                    values.append(0)
+            DECISION.pack_into(slot, DECISION_OFFSET, seq, 1,
+                               decision["action"], mask, *values)
+        except Exception:
+            # Malformed decisions that can't be stored end up here too
+            traceback.print_exc()
+            DECISION.pack_into(slot, DECISION_OFFSET, seq, 0, 0, 0, 0, 0)
+        decided.release()
+
+class Remotebot(Virtualbot):
+
+    """
+    Starts the worker process and the virtualbot inside of it
+    IN:  - dict containing initialization information about the arena
+         - class of the virtualbot to run in the worker
+         - seconds to wait for a decision before giving up on it
+    """
+    def __init__(self, arena_data, bot_class, timeout=0.5):
+
+        # Initialization
+        Virtualbot.__init__(self, arena_data)
+
+        # Remotebot stuff
+        self.bot_class = bot_class
+        self.timeout = timeout
+        self.seq = 0
+        self.pending = False
+        self.slot = mmap.mmap(-1, SLOT_SIZE)
+        self.observed = multiprocessing.Semaphore(0)
+        self.decided = multiprocessing.Semaphore(0)
+        receiver, sender = multiprocessing.Pipe(False)
+        self.worker = multiprocessing.Process(
+            target=_serve,
+            args=(bot_class, arena_data, self.slot,
+                  self.observed, self.decided, sender))
+        self.worker.daemon = True
+        self.worker.start()
+
+        # The worker reports what its virtualbot looks like once it's up
+        if receiver.poll(10):
+            self.image_path = receiver.recv()
+        else:
+            self.image_path = "img/dumbbot.png"
+
+    """
+    Override of Virtualbot's get_action(). Hands the status to the worker
+    and waits for its decision. While the worker is dead or still busy with
+    an earlier status, the bot just continues what it's doing. The status is
+    marked pending as it's handed over, and no longer as its decision is
+    taken, in critical sections so that the Dispatcher stopping the bot can't
+    come in between (see utils/interrupts.py). Otherwise the bot could end up
+    waiting for a decision that was never asked for, or was already taken.
+    """
+    def get_action(self, status):
+
+        continue_action = {"action": d.action.CONTINUE}
+
+        if not self.worker.is_alive():
+            return continue_action
+
+        # Still waiting for an answer to a status that timed out
+        if self.pending:
+            with critical:
+                if self.decided.acquire(False):
+                    self.pending = False
+            if self.pending:
+                return continue_action
+
+        # Write the status into the slot
+        self.seq += 1
+        bots = status["objects"]["bots"][:MAX_BOTS]
+        _pack_bot(self.slot, SELF_OFFSET, status)
+        for i, info in enumerate(bots):
+            _pack_bot(self.slot, BOTS_OFFSET + i * BOT.size, info)
+        HEADER.pack_into(self.slot, 0, self.seq, COMMAND_DECIDE,
+                         status["elapsed"], len(bots))
+        with critical:
+            self.pending = True
+            self.observed.release()
+
+        # Wait for the decision. An overrun meanwhile is held back until the
+        # wait is over, which the timeout bounds
+        with critical:
+            if self.decided.acquire(True, self.timeout):
+                self.pending = False
+        if self.pending:
+            return continue_action
+        fields = DECISION.unpack_from(self.slot, DECISION_OFFSET)
+        seq, valid, action, mask = fields[:4]
+        if seq != self.seq or not valid:
+            return None
+        decision = {"action": action}
+        for i, key in enumerate(DECISION_KEYS):
+            if mask & (1 << i):
+                decision[key] = _number(fields[4+i])
+        return decision
+
+    """
+    Override of Virtualbot's close(). Stops the worker process.
+    """
+    def close(self):
+        if self.worker.is_alive():
+            HEADER.pack_into(self.slot, 0, self.seq, COMMAND_STOP, 0, 0)
+            self.observed.release()
+            self.worker.join(1)
+            if self.worker.is_alive():
+                self.worker.terminate()
+
+class Remote(object):
+
+    """
+    Stands in for a virtualbot class in an arena's bot list, spawning the
+    virtualbot in a worker process instead (see Remotebot)
+    IN:  - class of the virtualbot to run in the worker
+         - seconds to wait for a decision before giving up on it
+    """
+    def __init__(self, bot_class, timeout=0.5):
+        self.bot_class = bot_class
+        self.timeout = timeout
+        self.__name__ = bot_class.__name__
+
+    def __call__(self, arena_data):
+        return Remotebot(arena_data, self.bot_class, self.timeout)
@@ -8,18 +8,23 @@ until either it or its target is dead (or the target goes out of sight).
 Stalkerbot uses Navbot to navigate and chase.
 """
 
-# Global imports
-import random
-
 # Local imports
 import real.definitions as d
 import utils.geometry as g
-from real.bullet import Bullet
+from real.bulletengine import BulletEngine
+from utils.collisiontable import get_collision_table
 from virtual.navbot import Navbot
 from virtual.queuebot import Queuebot
 
 class Stalkerbot(Navbot):
 
+    # Spread long searches over several decisions, see Navbot
+    SEARCH_BUDGET = 500
+
+    # Whether to chase along the flow fields shared by every bot chasing the
+    # same target (see Navbot.follow), rather than along a route of its own
+    FOLLOW_FIELDS = False
+
     def __init__(self, arena_data):
 
         # Initialization
@@ -30,10 +35,12 @@ class Stalkerbot(Navbot):
         self.target = None
         ### A lambda is just a tiny, anonymous in-line function. In this case,
         ### it's used as an alias to produce a random cooldown value
-        self.shoot_cooldown = lambda: random.randint(5,15)
+        self.shoot_cooldown = lambda: self.random.randint(5,15)
         self.shoot_counter = 0
-        self.search_cooldown = lambda: random.randint(3,7)
+        self.search_cooldown = lambda: self.random.randint(3,7)
         self.search_counter = 0
+        ### Distances from a bullet to the walls, shared with other bots
+        self.bullet_table = get_collision_table(self.walls, BulletEngine.SIZE)
         ### Preempt Queuebot, because Stalkerbot needs to adapt to environment
         self.preempt_queue()
 
@@ -43,7 +50,7 @@ class Stalkerbot(Navbot):
     def switch_target(self, enemies):
         self.shoot_counter = 0
         self.search_counter = 0
-        return random.choice(enemies)
+        return self.random.choice(enemies)
 
     """
     Most of the time, Stalkerbot has queued navigation path to a specific point
@@ -82,20 +89,27 @@ class Stalkerbot(Navbot):
                 self.search_counter = 0
                 return {"action": d.action.SHOOT}
 
-            # Periodically update the path to target
-            if self.search_counter <= 0:
+            # Periodically update the path to target. The target has
+            # usually moved only a little, so the route is repaired rather
+            # than planned from scratch (see Navbot.renavigate). A route
+            # still being searched for is let finish first
+            if self.search_counter <= 0 and not self.is_navigating():
                 self.search_counter = self.search_cooldown()
                 target_loc = (self.target["body"].left, self.target["body"].top)
                 self.clear_queue()
-                self.queue_navigate(target_loc)
+                if not (self.FOLLOW_FIELDS and self.queue_follow(target_loc)):
+                    self.queue_renavigate(target_loc)
 
         else:
 
-            # Wander around the arena to look for a new target
-            while self.is_queue_empty():
-                x = random.randrange(self.arena.width)
-                y = random.randrange(self.arena.height)
-                self.queue_navigate((x, y))
+            # Wander around the arena to look for a new target, picking
+            # only points the bot can get to from where it is
+            component = self.navbot_map.get_component(*self.get_location())
+            while self.is_queue_empty() and not self.is_navigating():
+                dest = self.navbot_map.random_position(self.random, component)
+                if dest is None:
+                    break
+                self.queue_navigate(dest)
 
     """
     Given a target's position, this method determines whether a bullet shot by
@@ -106,7 +120,7 @@ class Stalkerbot(Navbot):
     def can_hit(self, body):
 
         # Simulate bullet collision trajectory with target
-        bullet_body = g.scale(self.body, Bullet.SIZE)
+        bullet_body = g.scale(self.body, BulletEngine.SIZE)
         body_distance = g.predict_collision(bullet_body,
                                             [body],
                                             d.DX[self.direction],
@@ -115,10 +129,9 @@ class Stalkerbot(Navbot):
             return False
 
         # Simulate bullet collision trajectory with walls
-        block_distance = g.predict_collision(bullet_body,
-                                             self.walls,
-                                             d.DX[self.direction],
-                                             d.DY[self.direction])
+        block_distance = self.bullet_table.predict(bullet_body,
+                                                   d.DX[self.direction],
+                                                   d.DY[self.direction])
         if block_distance < body_distance:
             return False
 
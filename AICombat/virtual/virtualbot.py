@@ -12,6 +12,9 @@ build upon. It contains some utility functions that most virtualbots may find
 useful.
 """
 
+# Global imports
+import random
+
 # Local imports
 import real.definitions as d
 
@@ -38,6 +41,12 @@ class Virtualbot(object):
         self.hp = None
         self.ammo = None
 
+        # Every virtualbot gets its own random number generator, seeded from
+        # the global one, so that bots deciding concurrently (see Dispatcher)
+        # don't race each other for random numbers. Use self.random instead
+        # of the random module
+        self.random = random.Random(random.getrandbits(64))
+
     """
     Called whenever the realbot is ready to execute an action
     IN:  - a dict of various information about the bot status
@@ -47,6 +56,13 @@ class Virtualbot(object):
     def get_action(self, status):
         return {'action' : d.action.CONTINUE}
 
+    """
+    Called once the battle is over, to release anything the virtualbot holds
+    on to (e.g. see Remotebot). Does nothing by default
+    """
+    def close(self):
+        pass
+
     """
     Utility function to automatically store vital status attributes
     IN:  - realbot status dict